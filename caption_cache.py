@@ -0,0 +1,140 @@
+import os, json, time, sqlite3, hashlib, threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+from scan_cache import file_sha256
+
+SCHEMA_VERSION = 1
+
+def default_caption_cache_path() -> Path:
+    return Path.home() / ".jewels_caption_cache.sqlite"
+
+def request_key(body: dict, path: str | None = None) -> Tuple[str, str, str]:
+    """
+    (key, model, prompt) for a chat request. Inline images are replaced by the
+    hash of their payload; text-only requests that name a file also hash its
+    content, so the key covers image content, model, prompt, vision flag and
+    generation parameters.
+    """
+    prompt = ""
+    has_image = False
+    messages = []
+    for m in body.get("messages", []):
+        content = m.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    has_image = True
+                    url = part.get("image_url", {}).get("url", "")
+                    parts.append({"type": "image", "sha256": hashlib.sha256(url.encode("ascii", "ignore")).hexdigest()})
+                else:
+                    parts.append(part)
+                    if m.get("role") == "user":
+                        prompt = part.get("text", "")
+            content = parts
+        elif m.get("role") == "user":
+            prompt = content or ""
+        messages.append({"role": m.get("role"), "content": content})
+    norm = {k: v for k, v in body.items() if k != "messages"}
+    norm["messages"] = messages
+    if path and not has_image and os.path.isfile(path):
+        norm["file_sha256"] = file_sha256(Path(path))
+    key = hashlib.sha256(json.dumps(norm, sort_keys=True).encode("utf-8")).hexdigest()
+    return key, body.get("model", ""), prompt
+
+class CaptionCache:
+    """
+    Persistent LLM reply cache. Entries are evicted least-recently-used once
+    max_entries is exceeded.
+    """
+    def __init__(self, path: Path, max_entries: int = 100000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS replies")
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS replies ("
+            " key TEXT PRIMARY KEY, model TEXT, prompt TEXT, value TEXT, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS replies_lru ON replies(last_used)")
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM replies WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE replies SET last_used=? WHERE key=?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key: str, model: str, prompt: str, value: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO replies VALUES (?,?,?,?,?)",
+                              (key, model, prompt, value, time.time()))
+            self.puts += 1
+            if self.puts % 256 == 0:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        n = self.conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0]
+        if n > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM replies WHERE key IN (SELECT key FROM replies ORDER BY last_used LIMIT ?)",
+                (n - self.max_entries,))
+
+    def invalidate(self, model: str | None = None, prompt: str | None = None) -> int:
+        """Deletes entries for a model and/or prompts containing `prompt`; no filter clears all."""
+        where, args = [], []
+        if model:
+            where.append("model=?"); args.append(model)
+        if prompt:
+            where.append("instr(prompt, ?) > 0"); args.append(prompt)
+        sql = "DELETE FROM replies" + (" WHERE " + " AND ".join(where) if where else "")
+        with self.lock:
+            n = self.conn.execute(sql, args).rowcount
+            self.conn.commit()
+        return n
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self._evict()
+            self.conn.commit()
+            self.conn.close()
+
+_active: CaptionCache | None = None
+_active_lock = threading.Lock()
+
+def active_caption_cache() -> CaptionCache | None:
+    return _active
+
+def configure_caption_cache(lm_settings: dict) -> CaptionCache | None:
+    """Opens (or disables) the shared cache according to the lmstudio settings."""
+    global _active
+    with _active_lock:
+        if not lm_settings.get("cache_captions", True):
+            _active = None
+            return None
+        path = Path(lm_settings.get("caption_cache_path") or default_caption_cache_path())
+        max_entries = int(lm_settings.get("caption_cache_max_entries", 100000))
+        if _active is None or _active.path != path:
+            try:
+                _active = CaptionCache(path, max_entries)
+            except Exception as e:
+                print(f"Caption cache unavailable: {e}")
+                _active = None
+        else:
+            _active.max_entries = max_entries
+        return _active
@@ -1,5 +1,29 @@
 
-import json, urllib.request
+import json
+from llm_client import get_client, configure_client
+from caption_cache import active_caption_cache, request_key, configure_caption_cache
+
+def _post(endpoint: str, body: dict, timeout: float, path: str | None = None) -> dict:
+    # Replies are served from / stored in the caption cache when one is configured
+    cache = active_caption_cache()
+    key = None
+    if cache is not None:
+        try:
+            key, model, prompt = request_key(body, path)
+            hit = cache.get(key)
+            if hit is not None:
+                return {"choices": [{"message": {"content": hit}}], "cached": True}
+        except Exception:
+            key = None
+    data = get_client(endpoint).post_json(body, timeout=timeout)
+    if key is not None:
+        try:
+            content = data["choices"][0]["message"]["content"]
+            if isinstance(content, str) and content.strip():
+                cache.put(key, model, prompt, content)
+        except Exception:
+            pass
+    return data
 
 def lmstudio_describe(endpoint: str, model: str, path: str) -> str:
     prompt = "Give a concise 6-12 word description for this image filename. Avoid punctuation."
@@ -12,31 +36,96 @@ def lmstudio_describe(endpoint: str, model: str, path: str) -> str:
         "temperature": 0.2,
         "max_tokens": 64
     }
-    req = urllib.request.Request(endpoint, data=json.dumps(body).encode("utf-8"),
-                                 headers={"Content-Type":"application/json"})
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
+    data = _post(endpoint, body, timeout=30, path=path)
     try:
         return data["choices"][0]["message"]["content"].strip()
     except Exception:
         return "untitled"
 
 
-import base64, os
+import base64, os, re
+from pathlib import Path
+from typing import Tuple
+import cv2
+from image_processing import load_image_reduced, pil_to_cv
 
-def _b64_image(path: str) -> str:
+def parse_json_object(text: str) -> dict | None:
+    """
+    Parses a JSON object from a model reply, tolerating markdown fences and
+    prose around the object. Returns None if no object can be recovered.
+    """
+    text = (text or "").strip()
+    fence = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    if fence:
+        text = fence.group(1).strip()
+    candidates = [text]
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        candidates.append(text[start:end+1])
+    for c in candidates:
+        try:
+            obj = json.loads(c)
+        except Exception:
+            continue
+        if isinstance(obj, dict):
+            return obj
+    return None
+
+PAYLOAD_MIME = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+_payload = {"max_side": 1024, "format": "jpeg", "quality": 90}
+
+def configure_payload(lm_settings: dict):
+    _payload["max_side"] = int(lm_settings.get("payload_max_side", 1024))
+    fmt = str(lm_settings.get("payload_format", "jpeg")).lower()
+    _payload["format"] = fmt if fmt in PAYLOAD_MIME else "jpeg"
+    _payload["quality"] = int(lm_settings.get("payload_quality", 90))
+
+def encode_image_payload(path: str | None = None, image=None) -> Tuple[str, float]:
+    """
+    Data URI for a vision request, built from a BGR array when given, else
+    from the file (decoded at reduced scale). The image is downscaled to the
+    configured max side and re-encoded; scale is payload size / source size.
+    Returns ("", 1.0) if nothing could be encoded.
+    """
     try:
-        with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode("ascii")
+        max_side = _payload["max_side"]
+        if image is None:
+            im, native = load_image_reduced(Path(path), max_side or 1 << 30)
+            image = pil_to_cv(im)
+            src_long = max(native)
+        else:
+            src_long = max(image.shape[:2])
+        h, w = image.shape[:2]
+        if max_side and max(h, w) > max_side:
+            f = max_side / max(h, w)
+            image = cv2.resize(image, (max(1, round(w*f)), max(1, round(h*f))), interpolation=cv2.INTER_AREA)
+        fmt = _payload["format"]
+        if fmt == "webp":
+            params = [cv2.IMWRITE_WEBP_QUALITY, _payload["quality"]]
+        elif fmt == "jpeg":
+            params = [cv2.IMWRITE_JPEG_QUALITY, _payload["quality"]]
+        else:
+            params = []
+        ok, buf = cv2.imencode("." + fmt, image, params)
+        if not ok:
+            return "", 1.0
+        b64 = base64.b64encode(buf.tobytes()).decode("ascii")
+        return f"data:{PAYLOAD_MIME[fmt]};base64,{b64}", max(image.shape[:2]) / src_long
     except Exception:
-        return ""
+        return "", 1.0
 
-def lmstudio_caption(endpoint: str, model: str, path: str, prompt: str, vision: bool=False) -> str:
+def configure_lmstudio(lm_settings: dict):
+    """Applies client limits, caption cache and payload settings from the lmstudio settings."""
+    configure_client(lm_settings)
+    configure_caption_cache(lm_settings)
+    configure_payload(lm_settings)
+
+def lmstudio_caption(endpoint: str, model: str, path: str, prompt: str, vision: bool=False, image=None) -> str:
     if vision:
-        b64 = _b64_image(path)
+        url, _ = encode_image_payload(path, image)
         content = [{"type":"text","text":prompt}]
-        if b64:
-            content.append({"type":"image_url","image_url":{"url":"data:image/jpeg;base64,"+b64}})
+        if url:
+            content.append({"type":"image_url","image_url":{"url":url}})
         body = {"model": model, "messages":[{"role":"user","content": content}], "temperature":0.2, "max_tokens":128}
     else:
         body = {
@@ -48,27 +137,24 @@ def lmstudio_caption(endpoint: str, model: str, path: str, prompt: str, vision:
             "temperature": 0.2,
             "max_tokens": 128
         }
-    req = urllib.request.Request(endpoint, data=json.dumps(body).encode("utf-8"),
-                                 headers={"Content-Type":"application/json"})
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
+    data = _post(endpoint, body, timeout=60, path=path)
     try:
         return data["choices"][0]["message"]["content"].strip()
     except Exception:
         return ""
 
-def lmstudio_get_bbox(endpoint: str, model: str, path: str, prompt: str) -> list[int] | None:
+def lmstudio_get_bbox(endpoint: str, model: str, path: str, prompt: str, image=None) -> list[int] | None:
     """
     Asks the VLM for a bounding box and parses the JSON response.
-    Returns [x1, y1, x2, y2] or None on failure.
+    Returns [x1, y1, x2, y2] in source-image pixels or None on failure.
     """
-    b64 = _b64_image(path)
-    if not b64:
+    url, scale = encode_image_payload(path, image)
+    if not url:
         return None
 
     content = [
         {"type": "text", "text": prompt},
-        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + b64}}
+        {"type": "image_url", "image_url": {"url": url}}
     ]
 
     body = {
@@ -81,40 +167,30 @@ def lmstudio_get_bbox(endpoint: str, model: str, path: str, prompt: str) -> list
         "max_tokens": 512
     }
 
-    req = urllib.request.Request(endpoint, data=json.dumps(body).encode("utf-8"),
-                                 headers={"Content-Type": "application/json"})
-
     try:
-        with urllib.request.urlopen(req, timeout=120) as resp: # Long timeout
-            data = json.loads(resp.read().decode("utf-8"))
+        data = _post(endpoint, body, timeout=120, path=path) # Long timeout
 
         # The VLM's *message* is a JSON string. We must parse it.
-        content_str = data["choices"][0]["message"]["content"].strip()
-
-        # Clean up common markdown fences
-        if content_str.startswith("```json"):
-            content_str = content_str[7:].strip()
-        if content_str.endswith("```"):
-            content_str = content_str[:-3].strip()
-
-        content_json = json.loads(content_str)
+        content_json = parse_json_object(data["choices"][0]["message"]["content"])
+        if content_json is None:
+            raise ValueError("response is not a JSON object")
 
         bbox = content_json.get("bbox")
         if isinstance(bbox, list) and len(bbox) == 4:
-            # Ensure coordinates are integers
-            return [int(coord) for coord in bbox]
+            # The VLM answers in payload pixels; map back to the source image
+            return [int(round(float(coord) / scale)) for coord in bbox]
         return None
 
     except Exception as e:
         print(f"VLM get_bbox failed for {path}: {e}")
         return None
 
-def lmstudio_tags(endpoint: str, model: str, path: str, prompt: str, vision: bool=False) -> str:
+def lmstudio_tags(endpoint: str, model: str, path: str, prompt: str, vision: bool=False, image=None) -> str:
     if vision:
-        b64 = _b64_image(path)
+        url, _ = encode_image_payload(path, image)
         content = [{"type":"text","text":prompt}]
-        if b64:
-            content.append({"type":"image_url","image_url":{"url":"data:image/jpeg;base64,"+b64}})
+        if url:
+            content.append({"type":"image_url","image_url":{"url":url}})
         body = {"model": model, "messages":[{"role":"user","content": content}], "temperature":0.2, "max_tokens":128}
     else:
         body = {
@@ -126,11 +202,46 @@ def lmstudio_tags(endpoint: str, model: str, path: str, prompt: str, vision: boo
             "temperature": 0.2,
             "max_tokens": 64
         }
-    req = urllib.request.Request(endpoint, data=json.dumps(body).encode("utf-8"),
-                                 headers={"Content-Type":"application/json"})
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
+    data = _post(endpoint, body, timeout=60, path=path)
     try:
         return data["choices"][0]["message"]["content"].strip()
     except Exception:
         return ""
+
+
+def _as_text(v) -> str:
+    if isinstance(v, list):
+        return ", ".join(str(x).strip() for x in v if str(x).strip())
+    return v.strip() if isinstance(v, str) else ""
+
+def lmstudio_describe_all(endpoint: str, model: str, path: str, caption_prompt: str,
+                          tags_prompt: str, vision: bool=False, image=None) -> dict:
+    """
+    One request for the rename slug, caption and tags. Returns
+    {"slug", "caption", "tags"}; fields the model omitted or that could not be
+    parsed are "" so callers can fall back to the single-purpose calls.
+    """
+    prompt = (
+        "Respond ONLY with a single JSON object with the string keys \"slug\", \"caption\" and \"tags\".\n"
+        "slug: a concise 6-12 word description of the image, no punctuation.\n"
+        f"caption: {caption_prompt or 'a 1-2 sentence caption.'}\n"
+        f"tags: {tags_prompt or 'a comma-separated list of short tags.'}"
+    )
+    if vision:
+        url, _ = encode_image_payload(path, image)
+        content = [{"type":"text","text":prompt}]
+        if url:
+            content.append({"type":"image_url","image_url":{"url":url}})
+        messages = [{"role":"user","content": content}]
+    else:
+        messages = [
+            {"role":"system","content":"You are a precise captioning assistant that answers in JSON."},
+            {"role":"user","content": f"{prompt}\nImage path: {path}"}
+        ]
+    body = {"model": model, "messages": messages, "temperature": 0.2, "max_tokens": 384}
+    data = _post(endpoint, body, timeout=60, path=path)
+    try:
+        obj = parse_json_object(data["choices"][0]["message"]["content"]) or {}
+    except Exception:
+        obj = {}
+    return {k: _as_text(obj.get(k)) for k in ("slug", "caption", "tags")}
@@ -0,0 +1,208 @@
+import asyncio, os, threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from caption_providers import lmstudio_caption, lmstudio_tags, lmstudio_describe, lmstudio_describe_all
+from utils import slugify
+
+def caption_prompts(category_out: str, lm_settings: dict) -> Tuple[str, str]:
+    prompt_key = "caption_prompt_pass"
+    if category_out == "rescued":
+        prompt_key = "caption_prompt_rescued"
+    return lm_settings.get(prompt_key, ""), lm_settings.get("tags_prompt", "")
+
+def combined_fields(src: Path, category_out: str, lm_settings: dict, image=None) -> dict:
+    """Slug, caption and tags from one request; {} if the request fails."""
+    cap_prompt, tag_prompt = caption_prompts(category_out, lm_settings)
+    try:
+        return lmstudio_describe_all(
+            lm_settings.get("endpoint"),
+            lm_settings.get("model"),
+            str(src),
+            cap_prompt,
+            tag_prompt,
+            lm_settings.get("vision_mode", False),
+            image
+        )
+    except Exception as e:
+        print(f"LM Studio combined request failed for {src.name}: {e}")
+        return {}
+
+def write_captions(saved_path: Path, final_stem: str, category_out: str, lm_settings: dict,
+                   label: str = "", prefilled: dict|None = None, image=None) -> Dict[str, bool]:
+    """
+    Writes <stem>.txt / <stem>.tags.txt next to an exported image. Values in
+    prefilled (from combined_fields) are used as-is; anything missing is
+    requested individually. Returns success per attempted output.
+    """
+    label = label or saved_path.name
+    prefilled = prefilled or {}
+    done = {}
+    if not lm_settings.get("save_captions", True):
+        return done
+    cap_prompt, tag_prompt = caption_prompts(category_out, lm_settings)
+
+    if cap_prompt:
+        done["caption"] = False
+        try:
+            caption = prefilled.get("caption") or lmstudio_caption(
+                lm_settings.get("endpoint"),
+                lm_settings.get("model"),
+                str(saved_path),
+                cap_prompt,
+                lm_settings.get("vision_mode", False),
+                image
+            )
+            (saved_path.parent / f"{final_stem}.txt").write_text(caption, encoding="utf-8")
+            done["caption"] = True
+        except Exception as e:
+            print(f"LM Studio caption failed for {label}: {e}")
+
+    if tag_prompt:
+        done["tags"] = False
+        try:
+            tags = prefilled.get("tags") or lmstudio_tags(
+                lm_settings.get("endpoint"),
+                lm_settings.get("model"),
+                str(saved_path),
+                tag_prompt,
+                lm_settings.get("vision_mode", False),
+                image
+            )
+            (saved_path.parent / f"{final_stem}.tags.txt").write_text(tags, encoding="utf-8")
+            done["tags"] = True
+        except Exception as e:
+            print(f"LM Studio tagging failed for {label}: {e}")
+    return done
+
+@dataclass
+class CaptionJob:
+    saved_path: Path
+    final_stem: str
+    category_out: str
+    label: str = ""
+    prefilled: dict = field(default_factory=dict)
+    # rename_pattern naming: the file was encoded under the source stem and is
+    # renamed here; `source` is the image the slug is asked for
+    rename_index: int|None = None
+    source: str = ""
+    # export results (manifest row, journal files...) recorded by on_done once named
+    record: dict|None = None
+
+def rename_output(job: CaptionJob, lm_settings: dict, slug: str = ""):
+    """Moves job.saved_path to its rename_pattern name and updates the job."""
+    try:
+        desc = slug or lmstudio_describe(
+            lm_settings.get("endpoint"),
+            lm_settings.get("model"),
+            job.source or str(job.saved_path)
+        )
+        slug = slugify(desc) if (desc and desc != "untitled") else "image"
+        stem = lm_settings["rename_pattern"].format(
+            prefix=lm_settings.get("prefix", ""),
+            index=job.rename_index,
+            slug=slug
+        )
+    except Exception as e:
+        print(f"LM Studio rename failed for {job.label or job.saved_path.name}: {e}")
+        stem = f"rename-failed-{job.rename_index:05d}"
+    new_path = job.saved_path.with_name(stem + job.saved_path.name[len(job.final_stem):])
+    os.replace(job.saved_path, new_path)
+    job.saved_path, job.final_stem = new_path, stem
+
+def caption_job(job: CaptionJob, lm_settings: dict) -> Dict[str, bool]:
+    """Names (if pending) and captions one exported file, using a single combined request when enabled."""
+    prefilled = job.prefilled
+    if not prefilled and lm_settings.get("combined_request"):
+        prefilled = combined_fields(job.saved_path, job.category_out, lm_settings)
+    if job.rename_index is not None:
+        rename_output(job, lm_settings, prefilled.get("slug", ""))
+    return write_captions(job.saved_path, job.final_stem, job.category_out, lm_settings, job.label, prefilled)
+
+class CaptionStage:
+    """
+    Captions exported files on an asyncio loop in its own thread, so export
+    workers hand off a saved path and move on instead of waiting on the LLM.
+    submit() blocks while `queue_size` jobs are pending; `concurrency`
+    consumers each run one blocking request at a time. on_done(job, result)
+    is called from the stage thread after each job (result is None if it raised).
+    """
+    def __init__(self, lm_settings: dict, concurrency: int = 4, queue_size: int = 64,
+                 on_done: Callable[[CaptionJob, Dict[str, bool]|None], None]|None = None):
+        self.lm_settings = lm_settings
+        self.concurrency = max(1, concurrency)
+        self.on_done = on_done
+        self.submitted = 0
+        self.done = 0
+        self.failed = 0
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(self.concurrency, thread_name_prefix="caption"))
+        self.queue: asyncio.Queue = None
+        self.then: Callable[[], None]|None = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(max(1, queue_size),), name="caption-stage", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def _run(self, queue_size: int):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._main(queue_size))
+        self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
+        if self.then is not None:
+            self.then()
+
+    async def _main(self, queue_size: int):
+        self.queue = asyncio.Queue(queue_size)
+        self.ready.set()
+        await asyncio.gather(*(self._consume() for _ in range(self.concurrency)))
+
+    async def _consume(self):
+        while True:
+            job = await self.queue.get()
+            if job is None:
+                return
+            try:
+                result = await self.loop.run_in_executor(None, caption_job, job, self.lm_settings)
+            except Exception as e:
+                print(f"Caption stage failed for {job.label or job.saved_path.name}: {e}")
+                result = None
+            self.done += 1
+            if not result or not all(result.values()):
+                self.failed += 1
+            if self.on_done:
+                self.on_done(job, result)
+
+    def submit(self, job: CaptionJob):
+        self.submitted += 1
+        asyncio.run_coroutine_threadsafe(self.queue.put(job), self.loop).result()
+
+    def drop_pending(self):
+        """Discards queued jobs that no consumer has taken yet (an export was cancelled)."""
+        async def drain():
+            stops = 0
+            while not self.queue.empty():
+                if self.queue.get_nowait() is None:
+                    stops += 1
+                else:
+                    self.submitted -= 1
+            for _ in range(stops):
+                self.queue.put_nowait(None)
+        asyncio.run_coroutine_threadsafe(drain(), self.loop).result()
+
+    def close(self, wait: bool = True, then: Callable[[], None]|None = None):
+        """
+        Lets queued jobs finish, then stops the loop thread. `then` is called
+        on that thread once the last job is done, so callers that must not
+        block can pass wait=False.
+        """
+        self.then = then
+        async def stop():
+            # queued after every job submitted so far; may wait for room in the queue
+            for _ in range(self.concurrency):
+                await self.queue.put(None)
+        asyncio.run_coroutine_threadsafe(stop(), self.loop)
+        if wait:
+            self.thread.join()
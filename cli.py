@@ -0,0 +1,484 @@
+"""
+Headless command line: scan, watch, triage export, captioning and training-set
+assembly without a display. Progress is written to stdout as JSON lines.
+
+Exit codes: 0 success, 1 error, 2 finished with per-item failures,
+130 cancelled (SIGINT/SIGTERM during a scan or export; an export resumes).
+"""
+import argparse, csv, json, shutil, signal, sys, time
+from contextlib import contextmanager
+from dataclasses import asdict, fields
+from pathlib import Path
+
+from utils import AppSettings
+from llm_client import get_client
+from caption_cache import CaptionCache, default_caption_cache_path
+from placement import PLACEMENT_MODES
+from output_profiles import PROFILES
+
+EXIT_OK, EXIT_ERROR, EXIT_PARTIAL, EXIT_CANCELLED = 0, 1, 2, 130
+_events = sys.stdout
+
+def emit(event: str, **data):
+    _events.write(json.dumps({"event": event, "ts": round(time.time(), 3), **data}) + "\n")
+    _events.flush()
+
+class Progress:
+    """Throttled JSON-lines progress with per-stage throughput."""
+    def __init__(self, stage: str, interval: float, scheduler=None):
+        self.stage = stage
+        self.interval = interval
+        self.scheduler = scheduler
+        self.start = time.perf_counter()
+        self.last = 0.0
+
+    def rate(self, done: int) -> float:
+        elapsed = time.perf_counter() - self.start
+        return round(done / elapsed, 2) if elapsed > 0 else 0.0
+
+    def update(self, done: int, total: int):
+        now = time.perf_counter()
+        if done < total and now - self.last < self.interval:
+            return
+        self.last = now
+        extra = {}
+        if self.scheduler is not None:
+            st = self.scheduler.stats()
+            extra = {k: st[k] for k in ("queued", "inflight", "inflight_mb")}
+        emit("progress", stage=self.stage, done=done, total=total, items_per_s=self.rate(done), **extra)
+
+    def finish(self, done: int, **extra):
+        emit("stage_done", stage=self.stage, done=done,
+             seconds=round(time.perf_counter() - self.start, 3), items_per_s=self.rate(done), **extra)
+        if self.scheduler is not None:
+            emit("scheduler", stage=self.stage, **self.scheduler.stats())
+
+def _core_app():
+    from PySide6.QtCore import QCoreApplication
+    return QCoreApplication.instance() or QCoreApplication([sys.argv[0]])
+
+@contextmanager
+def _cancel_on_signal(manager):
+    """SIGINT/SIGTERM cancel `manager` (it still finishes, with partial results) instead of killing the run."""
+    from PySide6.QtCore import QTimer
+    state = {}
+    prev = {s: signal.signal(s, lambda *_: state.setdefault("hit", True)) for s in (signal.SIGINT, signal.SIGTERM)}
+
+    def check():
+        # the handler only flags it; cancelling from inside a slot it interrupted could re-enter it
+        if state.pop("hit", False):
+            emit("cancel", stage="signal")
+            manager.cancel()
+
+    tick = QTimer()  # lets Python run the signal handlers while Qt waits
+    tick.timeout.connect(check)
+    tick.start(250)
+    try:
+        yield
+    finally:
+        tick.stop()
+        for s, h in prev.items():
+            signal.signal(s, h)
+
+def _add_scan_config_flags(p: argparse.ArgumentParser):
+    from worker import ScanConfig
+    g = p.add_argument_group("scan config")
+    for f in fields(ScanConfig):
+        flag = "--" + f.name.replace("_", "-")
+        if isinstance(f.default, bool):
+            g.add_argument(flag, dest=f.name, action=argparse.BooleanOptionalAction, default=None)
+        else:
+            g.add_argument(flag, dest=f.name, type=type(f.default), default=None)
+
+def _scan_config(args, settings: AppSettings):
+    from worker import ScanConfig, scan_config_from_settings
+    cfg = scan_config_from_settings(settings.data)
+    for f in fields(ScanConfig):
+        v = getattr(args, f.name, None)
+        if v is not None:
+            setattr(cfg, f.name, v)
+    return cfg
+
+def _apply_threads(args, settings: AppSettings):
+    from PySide6.QtCore import QThreadPool
+    from image_cache import shared_image_cache
+    from subject_detection import configure_subject_detector
+    if args.threads:
+        QThreadPool.globalInstance().setMaxThreadCount(args.threads)
+    shared_image_cache().set_budget(settings.data.get("decoded_cache_mb", 1024))
+    configure_subject_detector(settings.data.get("subject_detectors", "haar_face,saliency"),
+                               settings.data.get("detect_proxy_side", 512))
+
+def serializable_item(item: dict) -> dict:
+    return {k: v for k, v in item.items() if k not in ("thumbnail_qimage", "thumb_ref")}
+
+def run_scan(folder: Path, cfg, interval: float, state: dict|None = None) -> tuple[list, int, bool]:
+    """
+    Scans folder; returns (items, failed, cancelled). `state`, if given,
+    receives the ScanManager for later rescans.
+    """
+    from worker import ScanManager
+    if not folder.is_dir():
+        raise FileNotFoundError(f"Not a folder: {folder}")
+    app = _core_app()
+    manager = ScanManager(folder, cfg)
+    if state is not None:
+        state["manager"] = manager
+    prog = Progress("scan", interval, manager.scheduler)
+    out = {}
+
+    def on_finished(results):
+        out["results"] = results
+        app.quit()
+
+    manager.progress.connect(prog.update)
+    manager.finished.connect(on_finished)
+    emit("stage_start", stage="scan", folder=str(folder))
+    with _cancel_on_signal(manager):
+        manager.run()
+        if "results" not in out:
+            app.exec()
+    results = out["results"]
+    cancelled = manager.token.cancelled
+    # files a cancel dropped are unscanned, not failed
+    failed = 0 if cancelled else manager.total - len(results)
+    prog.finish(len(results), total=manager.total, failed=failed, cancelled=cancelled)
+    return results, failed, cancelled
+
+def cmd_scan(args, settings: AppSettings) -> int:
+    _apply_threads(args, settings)
+    cfg = _scan_config(args, settings)
+    results, failed, cancelled = run_scan(Path(args.folder), cfg, args.progress_interval)
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "folder": str(Path(args.folder).resolve()), "config": asdict(cfg),
+            "items": [serializable_item(it) for it in results]
+        }, indent=1), encoding="utf-8")
+    counts = {}
+    for it in results:
+        counts[it["status"]] = counts.get(it["status"], 0) + 1
+    emit("summary", stage="scan", counts=counts, failed=failed, cancelled=cancelled, results=args.out or None)
+    if cancelled:
+        return EXIT_CANCELLED
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+def run_export(items: list, out_dir: Path, cfg, args, settings: AppSettings, resume: bool):
+    """Runs one export in a local event loop and reports its stages; returns the ExportManager."""
+    from PySide6.QtCore import QEventLoop
+    from worker import ExportManager
+    lm = dict(settings.data.get("lmstudio", {}))
+    if args.no_lm:
+        lm["enabled"] = False
+    _core_app()
+    manager = ExportManager(
+        items, out_dir,
+        buckets=args.buckets or settings.data.get("buckets", [1024, 1152, 1216]),
+        apply_autofix=settings.data.get("autofix", True) if args.autofix is None else args.autofix,
+        cfg=cfg, lm_settings=lm,
+        metadata_template=settings.data.get("metadata_template", {}),
+        enable_intelligent_crop=settings.data.get("enable_intelligent_crop", True),
+        resume=resume,
+        text_reports=settings.data.get("text_reports", False) if args.text_reports is None else args.text_reports,
+        placement=args.placement or settings.data.get("placement", "hardlink"),
+        output_profile=args.profile or settings.data.get("output_profile", "png")
+    )
+    prog = Progress("export", args.progress_interval, manager.scheduler)
+    state = {}
+    loop = QEventLoop()
+
+    def on_finished(path):
+        state["done"] = True
+        loop.quit()
+
+    cap_prog = Progress("caption", args.progress_interval)
+    manager.progress.connect(prog.update)
+    manager.caption_progress.connect(cap_prog.update)
+    manager.finished.connect(on_finished)
+    emit("stage_start", stage="export", items=len(items), out=str(out_dir))
+    with _cancel_on_signal(manager):
+        manager.run()
+        if "done" not in state:
+            loop.exec()
+    prog.finish(manager.done - manager.failed - manager.cancelled, total=manager.total,
+                failed=manager.failed, cancelled=manager.cancelled)
+    if manager.captions is not None:
+        cap = manager.captions
+        cap_prog.finish(cap.done - cap.failed, total=cap.submitted, failed=cap.failed)
+    if lm.get("enabled"):
+        emit("llm_stats", stage="export", **get_client(lm.get("endpoint", "")).stats())
+    return manager
+
+def cmd_export(args, settings: AppSettings) -> int:
+    _apply_threads(args, settings)
+    cfg = _scan_config(args, settings)
+    src = Path(args.source)
+    scan_failed = 0
+    if src.is_file():
+        items = json.loads(src.read_text(encoding="utf-8"))["items"]
+    else:
+        items, scan_failed, cancelled = run_scan(src, cfg, args.progress_interval)
+        if cancelled:
+            emit("summary", stage="export", cancelled=True)
+            return EXIT_CANCELLED
+    items = [it for it in items if it.get("status") in ("PASS","FAIL","DUPLICATE")]
+    out_dir = Path(args.out)
+    manager = run_export(items, out_dir, cfg, args, settings, args.resume)
+    emit("summary", stage="export", manifest=str(out_dir / "manifest.csv"), report=str(out_dir / "report.jsonl"),
+         skipped=manager.skipped, failed=manager.failed + scan_failed, cancelled=manager.cancelled)
+    if manager.token.cancelled:
+        return EXIT_CANCELLED
+    return EXIT_PARTIAL if (manager.failed or scan_failed) else EXIT_OK
+
+def cmd_watch(args, settings: AppSettings) -> int:
+    from PySide6.QtCore import QTimer
+    from watcher import FolderWatcher
+    _apply_threads(args, settings)
+    cfg = _scan_config(args, settings)
+    folder = Path(args.folder)
+    state = {}
+    results, _, cancelled = run_scan(folder, cfg, args.progress_interval, state)
+    if cancelled:
+        return EXIT_CANCELLED
+    manager = state["manager"]
+    out_dir = Path(args.out) if args.out else None
+    if out_dir is not None:
+        run_export([it for it in results if it.get("status") in ("PASS","FAIL","DUPLICATE")],
+                   out_dir, cfg, args, settings, resume=True)
+    app = _core_app()
+    watcher = FolderWatcher(folder, args.interval or settings.data.get("watch_interval", 2.0),
+                            settings.data.get("watch_backend", "auto"), cfg.discovery_workers)
+
+    def on_changes(changed, deleted):
+        emit("watch_change", changed=changed, deleted=deleted)
+        manager.rescan(changed, deleted)
+
+    def on_updated(changed, removed):
+        emit("watch_update", items=[serializable_item(it) for it in changed], removed=removed)
+        if out_dir is not None:
+            # the journal skips every item whose source and label are unchanged
+            run_export([it for it in manager.results if it.get("status") in ("PASS","FAIL","DUPLICATE")],
+                       out_dir, cfg, args, settings, resume=True)
+
+    watcher.changes.connect(on_changes)
+    manager.updated.connect(on_updated)
+    watcher.start(manager.signatures())
+    emit("stage_start", stage="watch", folder=str(folder), backend=watcher.backend_name)
+    signal.signal(signal.SIGINT, lambda *_: app.quit())
+    signal.signal(signal.SIGTERM, lambda *_: app.quit())
+    tick = QTimer()  # lets Python run the signal handlers while Qt waits
+    tick.timeout.connect(lambda: None)
+    tick.start(250)
+    app.exec()
+    watcher.stop()
+    emit("summary", stage="watch", items=len(manager.results))
+    return EXIT_OK
+
+def _caption_targets(out_dir: Path, overwrite: bool) -> list[tuple[Path, str, str]]:
+    targets = []
+    for bucket in ("pass", "rescued"):
+        exts = {"." + p.ext for p in PROFILES.values()}
+        for img in sorted(f for f in (out_dir / bucket).glob("*.*") if f.suffix in exts):
+            stem = img.name.rsplit(".", 2)[0]
+            if overwrite or not (img.parent / f"{stem}.txt").exists():
+                targets.append((img, stem, bucket))
+    return targets
+
+def cmd_caption(args, settings: AppSettings) -> int:
+    from caption_stage import CaptionStage, CaptionJob
+    from caption_providers import configure_lmstudio
+    lm = dict(settings.data.get("lmstudio", {}))
+    if not lm.get("endpoint"):
+        emit("error", stage="caption", message="No LM Studio endpoint configured")
+        return EXIT_ERROR
+    configure_lmstudio(lm)
+    client = get_client(lm["endpoint"])
+    targets = _caption_targets(Path(args.out_dir), args.overwrite)
+    prog = Progress("caption", args.progress_interval)
+    emit("stage_start", stage="caption", items=len(targets))
+    stage = CaptionStage(lm, concurrency=args.threads or int(lm.get("caption_concurrency", 4)),
+                         queue_size=int(lm.get("caption_queue_size", 64)),
+                         on_done=lambda job, result: prog.update(stage.done, len(targets)))
+    for img, stem, bucket in targets:
+        stage.submit(CaptionJob(img, stem, bucket))
+    stage.close()
+    prog.finish(stage.done - stage.failed, total=len(targets), failed=stage.failed)
+    emit("llm_stats", stage="caption", **client.stats())
+    return EXIT_PARTIAL if stage.failed else EXIT_OK
+
+def cmd_build_training(args, settings: AppSettings) -> int:
+    export_dir = Path(args.export_dir)
+    manifest = export_dir / "manifest.csv"
+    if not manifest.exists():
+        emit("error", stage="build-training", message=f"{manifest} not found")
+        return EXIT_ERROR
+    dest = Path(args.out) if args.out else export_dir / "training"
+    dest.mkdir(parents=True, exist_ok=True)
+    with open(manifest, newline="", encoding="utf-8") as f:
+        rows = [r for r in csv.DictReader(f)
+                if r.get("bucket") in ("pass", "rescued")
+                and (args.all or r.get("selected_for_training") == "True")]
+    prog = Progress("build-training", args.progress_interval)
+    emit("stage_start", stage="build-training", items=len(rows), out=str(dest))
+    copied = failed = 0
+    for r in rows:
+        try:
+            img = export_dir / r["output"]
+            stem = img.name.rsplit(".", 2)[0]
+            shutil.copy2(img, dest / img.name)
+            for side in (f"{stem}.txt", f"{stem}.tags.txt"):
+                if (img.parent / side).exists():
+                    shutil.copy2(img.parent / side, dest / side)
+            copied += 1
+        except Exception as e:
+            failed += 1
+            emit("item_error", stage="build-training", name=r.get("name"), message=str(e))
+        prog.update(copied + failed, len(rows))
+    prog.finish(copied, total=len(rows), failed=failed)
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+def cmd_caption_cache(args, settings: AppSettings) -> int:
+    lm = settings.data.get("lmstudio", {})
+    cache = CaptionCache(Path(lm.get("caption_cache_path") or default_caption_cache_path()))
+    if args.model or args.prompt or args.all:
+        removed = cache.invalidate(model=args.model, prompt=args.prompt)
+        emit("caption_cache", action="invalidate", removed=removed, remaining=cache.count())
+    else:
+        emit("caption_cache", action="stats", entries=cache.count(), path=str(cache.path))
+    cache.close()
+    return EXIT_OK
+
+def cmd_bench(args, settings: AppSettings) -> int:
+    import cv2
+    from image_processing import load_image_fix, pil_to_cv, bucket_square, benchmark_noise
+    from output_profiles import benchmark
+    src = Path(args.source)
+    exts = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}
+    files = [src] if src.is_file() else sorted(p for p in src.rglob("*") if p.suffix.lower() in exts)
+    if args.noise:
+        # full-resolution grayscale, as the scan measures it
+        grays = [cv2.cvtColor(pil_to_cv(load_image_fix(p)), cv2.COLOR_BGR2GRAY) for p in files[:args.limit]]
+        if not grays:
+            emit("error", stage="bench", message=f"no images in {src}")
+            return EXIT_ERROR
+        emit("stage_start", stage="bench", items=len(grays), kind="noise")
+        for row in benchmark_noise(grays, args.repeat):
+            emit("bench_noise", **row)
+        return EXIT_OK
+    images = [bucket_square(pil_to_cv(load_image_fix(p)), args.size) for p in files[:args.limit]]
+    if not images:
+        emit("error", stage="bench", message=f"no images in {src}")
+        return EXIT_ERROR
+    emit("stage_start", stage="bench", items=len(images), size=args.size)
+    for row in benchmark(images, args.profiles, args.repeat):
+        emit("bench", **row)
+    return EXIT_OK
+
+def cmd_metadata(args, settings: AppSettings) -> int:
+    from metadata import rewrite_file
+    exts = {".png", ".jpg", ".jpeg", ".webp"}
+    files = []
+    for p in map(Path, args.paths):
+        files += [p] if p.is_file() else sorted(f for f in p.rglob("*") if f.suffix.lower() in exts)
+    template = settings.data.get("metadata_template", {}) if args.template else None
+    prog = Progress("metadata", args.progress_interval)
+    emit("stage_start", stage="metadata", items=len(files), strip=args.strip, template=bool(template))
+    done = failed = 0
+    for f in files:
+        try:
+            rewrite_file(f, strip=args.strip, template=template)
+            done += 1
+        except Exception as e:
+            failed += 1
+            emit("item_error", stage="metadata", name=str(f), message=str(e))
+        prog.update(done + failed, len(files))
+    prog.finish(done, total=len(files), failed=failed)
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+COMMANDS = {"scan": cmd_scan, "export": cmd_export, "caption": cmd_caption, "build-training": cmd_build_training,
+            "caption-cache": cmd_caption_cache, "bench": cmd_bench, "metadata": cmd_metadata, "watch": cmd_watch}
+
+def _add_export_flags(p):
+    p.add_argument("--buckets", type=int, nargs="+")
+    p.add_argument("--autofix", action=argparse.BooleanOptionalAction, default=None)
+    p.add_argument("--no-lm", action="store_true", help="disable LM Studio naming/captions")
+    p.add_argument("--text-reports", action=argparse.BooleanOptionalAction, default=None,
+                   help="also write reports/<stem>.txt per image")
+    p.add_argument("--placement", choices=PLACEMENT_MODES,
+                   help="how duplicates/maybe/fail are placed; later strategies are fallbacks")
+    p.add_argument("--profile", choices=list(PROFILES), help="output encoding profile for pass/rescued")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="jewels", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--settings", default=str(Path.home() / ".jewels_settings.json"),
+                        help="settings JSON (defaults for every flag)")
+    parser.add_argument("--progress-interval", type=float, default=1.0,
+                        help="seconds between progress lines")
+    parser.add_argument("--threads", type=int, default=0, help="worker threads (0 = Qt default)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scan", help="scan a folder and optionally save results as JSON")
+    p.add_argument("folder")
+    p.add_argument("--out", help="write scan results JSON here")
+    _add_scan_config_flags(p)
+
+    p = sub.add_parser("export", help="triage export from a folder or a saved scan JSON")
+    p.add_argument("source", help="image folder or scan results JSON")
+    p.add_argument("--out", required=True, help="export directory")
+    p.add_argument("--resume", action="store_true",
+                   help="skip items the export journal shows as finished with the same settings")
+    _add_export_flags(p)
+    _add_scan_config_flags(p)
+
+    p = sub.add_parser("watch", help="scan, then rescan (and re-export) images as they change")
+    p.add_argument("folder")
+    p.add_argument("--out", help="export here after the scan and after every change (resumed)")
+    p.add_argument("--interval", type=float, help="seconds between change checks")
+    _add_export_flags(p)
+    _add_scan_config_flags(p)
+
+    p = sub.add_parser("caption", help="caption pass/ and rescued/ outputs that have no .txt yet")
+    p.add_argument("out_dir")
+    p.add_argument("--overwrite", action="store_true")
+
+    p = sub.add_parser("build-training", help="collect selected pass/rescued outputs into training/")
+    p.add_argument("export_dir")
+    p.add_argument("--out", help="destination (default <export_dir>/training)")
+    p.add_argument("--all", action="store_true", help="ignore the selection gate")
+
+    p = sub.add_parser("caption-cache", help="show or invalidate cached LLM replies")
+    p.add_argument("--model", help="invalidate entries for this model")
+    p.add_argument("--prompt", help="invalidate entries whose prompt contains this text")
+    p.add_argument("--all", action="store_true", help="invalidate everything")
+
+    p = sub.add_parser("bench", help="encode time and size per output profile")
+    p.add_argument("source", help="image file or folder")
+    p.add_argument("--profiles", nargs="+", default=list(PROFILES) + ["pillow-optimize"],
+                   choices=list(PROFILES) + ["pillow-optimize"])
+    p.add_argument("--size", type=int, default=1024, help="bucket size images are squared to first")
+    p.add_argument("--limit", type=int, default=8)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--noise", action="store_true",
+                   help="time estimate_noise_std against the reference loop instead of encoding")
+
+    p = sub.add_parser("metadata", help="strip EXIF/XMP/text metadata in place and/or write the template")
+    p.add_argument("paths", nargs="+", help="JPEG/PNG/WebP files or folders")
+    p.add_argument("--strip", action=argparse.BooleanOptionalAction, default=True)
+    p.add_argument("--template", action="store_true", help="write settings metadata_template fields")
+    return parser
+
+def main(argv=None) -> int:
+    global _events
+    args = build_parser().parse_args(argv)
+    # stdout carries only JSON lines; stray prints from workers go to stderr
+    _events, sys.stdout = sys.stdout, sys.stderr
+    try:
+        settings = AppSettings(Path(args.settings))
+        return COMMANDS[args.command](args, settings)
+    except Exception as e:
+        emit("error", stage=args.command, message=str(e))
+        return EXIT_ERROR
+    finally:
+        sys.stdout = _events
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+IMAGE_EXTS = frozenset({".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"})
+
+def _scan_dir(d: str, exts, inode_order: bool = False) -> Tuple[List[Tuple[int, str]], List[str]]:
+    # inode() may stat on Windows, so it is only asked for when sorting by it
+    files, dirs = [], []
+    try:
+        with os.scandir(d) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        dirs.append(e.path)
+                    elif os.path.splitext(e.name)[1].lower() in exts and e.is_file():
+                        files.append((e.inode() if inode_order else 0, e.path))
+                except OSError:
+                    continue
+    except OSError as ex:
+        print(f"Cannot list {d}: {ex}")
+    return files, dirs
+
+def discover(root: Path, exts=IMAGE_EXTS, workers: int = 8, inode_order: bool = False) -> Iterator[List[Path]]:
+    """
+    Walks root with os.scandir on `workers` threads and yields the image
+    files of each directory as soon as it is listed, so scanning can start
+    before the walk ends. Only DirEntry names are checked; nothing is stat'd
+    except by is_file() on matching names. With inode_order each batch is
+    sorted by inode, which keeps spinning disks reading mostly forward.
+    Symlinked directories are not followed.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="discover") as ex:
+        pending = {ex.submit(_scan_dir, str(root), exts, inode_order)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                files, dirs = fut.result()
+                pending |= {ex.submit(_scan_dir, d, exts, inode_order) for d in dirs}
+                if files:
+                    if inode_order:
+                        files.sort()
+                    yield [Path(p) for _, p in files]
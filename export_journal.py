@@ -0,0 +1,106 @@
+import os, json, time, hashlib, threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from scan_cache import file_signature, file_sha256
+
+JOURNAL_NAME = "export.journal.jsonl"
+
+# lmstudio keys that only affect throughput, not what gets written
+_LM_RUNTIME_KEYS = {"max_in_flight", "retries", "retry_backoff", "caption_concurrency", "caption_queue_size",
+                    "cache_captions", "caption_cache_path", "caption_cache_max_entries"}
+# ScanConfig fields that only affect how the work is scheduled
+_CFG_RUNTIME_KEYS = {"use_cache", "cache_path", "cache_verify_hash", "backend", "workers", "chunk_size",
+                     "discovery_workers", "inode_order", "max_inflight", "memory_budget_mb"}
+
+def settings_fingerprint(settings: dict) -> str:
+    s = dict(settings)
+    if isinstance(s.get("lm_settings"), dict):
+        s["lm_settings"] = {k: v for k, v in s["lm_settings"].items() if k not in _LM_RUNTIME_KEYS}
+    if isinstance(s.get("cfg"), dict):
+        s["cfg"] = {k: v for k, v in s["cfg"].items() if k not in _CFG_RUNTIME_KEYS}
+    return hashlib.sha256(json.dumps(s, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+class ExportJournal:
+    """
+    Append-only JSONL record of finished export items in the output folder.
+    Each line holds the source signature and hash, the settings fingerprint,
+    the produced files (relative path + size), the manifest row and the
+    report record. Lines are fsync'd every `batch` items or `interval`
+    seconds. On resume an item is complete when its source, fingerprint and
+    every produced file still match.
+    """
+    def __init__(self, out_dir: Path, fingerprint: str, resume: bool = False, batch: int = 32,
+                 interval: float = 2.0):
+        self.out_dir = Path(out_dir)
+        self.path = self.out_dir / JOURNAL_NAME
+        self.fingerprint = fingerprint
+        self.batch = max(1, batch)
+        self.interval = interval
+        self.last_sync = time.monotonic()
+        self.lock = threading.Lock()
+        self.pending: List[str] = []
+        self.entries: Dict[str, dict] = self._load() if resume else {}
+        self.f = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if self.f.tell() > 0:
+            self.f.write("\n")  # terminate a torn last line; blank lines are skipped on load
+
+    def _load(self) -> Dict[str, dict]:
+        entries = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                entries[e["src"]] = e
+        return entries
+
+    def completed(self, src: Path) -> Optional[dict]:
+        """The journal entry if src was already exported with these settings and its outputs are intact."""
+        e = self.entries.get(str(src))
+        if e is None or e.get("fingerprint") != self.fingerprint:
+            return None
+        try:
+            size, mtime_ns = file_signature(src)
+            if (size, mtime_ns) != (e["size"], e["mtime_ns"]) and \
+                    (size != e["size"] or file_sha256(src) != e["sha256"]):
+                return None
+            for out in e["files"]:
+                if (self.out_dir / out["path"]).stat().st_size != out["size"]:
+                    return None
+        except OSError:
+            return None
+        return e
+
+    def record(self, src: Path, row: dict, files: List[Path], caption: dict|None = None,
+               report: dict|None = None):
+        size, mtime_ns = file_signature(src)
+        entry = {
+            "src": str(src), "size": size, "mtime_ns": mtime_ns, "sha256": file_sha256(src),
+            "fingerprint": self.fingerprint,
+            "files": [{"path": p.relative_to(self.out_dir).as_posix(), "size": p.stat().st_size} for p in files],
+            "row": row, "caption": caption, "report": report
+        }
+        with self.lock:
+            self.pending.append(json.dumps(entry))
+            if len(self.pending) >= self.batch or time.monotonic() - self.last_sync >= self.interval:
+                self._sync()
+
+    def _sync(self):
+        if self.pending:
+            self.f.write("\n".join(self.pending) + "\n")
+            self.pending = []
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if not self.f.closed:
+                self._sync()
+                self.f.close()
@@ -0,0 +1,86 @@
+import os, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from PIL import Image
+from image_processing import load_image_fix
+
+def _image_bytes(im: Image.Image) -> int:
+    return im.width * im.height * len(im.getbands())
+
+class DecodedImageCache:
+    """
+    Process-wide LRU of load_image_fix results, bounded by decoded size in MB.
+    Entries are keyed by path + size + mtime so edited files are re-decoded.
+    Cached images are shared: callers must copy before mutating.
+    """
+    def __init__(self, budget_mb: float = 1024):
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple[str, int, int], Image.Image]" = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.set_budget(budget_mb)
+
+    @staticmethod
+    def _key(p: Path) -> Tuple[str, int, int]:
+        st = os.stat(p)
+        return str(p), st.st_size, st.st_mtime_ns
+
+    def set_budget(self, budget_mb: float):
+        with self.lock:
+            self.budget = int(max(0.0, budget_mb) * 1024 * 1024)
+            self._evict()
+
+    def _evict(self):
+        while self.used > self.budget and self.entries:
+            _, im = self.entries.popitem(last=False)
+            self.used -= _image_bytes(im)
+
+    def get(self, p: Path) -> Optional[Image.Image]:
+        try:
+            key = self._key(p)
+        except OSError:
+            return None
+        with self.lock:
+            im = self.entries.get(key)
+            if im is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return im
+
+    def put(self, p: Path, im: Image.Image):
+        size = _image_bytes(im)
+        if size > self.budget:
+            return
+        key = self._key(p)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used -= _image_bytes(old)
+            self.entries[key] = im
+            self.used += size
+            self._evict()
+
+    def load(self, p: Path) -> Image.Image:
+        im = self.get(p)
+        if im is None:
+            im = load_image_fix(p)
+            self.put(p, im)
+        return im
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+_shared = DecodedImageCache()
+
+def shared_image_cache() -> DecodedImageCache:
+    return _shared
+
+def load_image_cached(path: Path) -> Image.Image:
+    return _shared.load(Path(path))
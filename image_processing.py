@@ -1,32 +1,67 @@
 
-import io, hashlib
+import io, hashlib, os, time
 from pathlib import Path
-from typing import Tuple, Optional, Dict
+from typing import Tuple, Optional, Dict, List
 import numpy as np
 from PIL import Image, ImageOps, ImageCms
 import cv2
 import imagehash
+from metadata import inject_metadata
+from subject_detection import (
+    Detection, HaarFaceDetector, SaliencyDetector, subject_detector
+)
+
+def _normalize_loaded(im: Image.Image) -> Image.Image:
+    im = ImageOps.exif_transpose(im)
+    if im.mode not in ("RGB","RGBA","L"):
+        im = im.convert("RGB")
+    if im.mode == "RGBA":
+        bg = Image.new("RGB", im.size, (0,0,0))
+        bg.paste(im, mask=im.split()[-1])
+        im = bg
+    icc = im.info.get("icc_profile")
+    if icc:
+        try:
+            srgb = ImageCms.createProfile("sRGB")
+            src = ImageCms.ImageCmsProfile(io.BytesIO(icc))
+            im = ImageCms.profileToProfile(im, src, srgb, outputMode="RGB")
+        except Exception:
+            im = im.convert("RGB")
+    else:
+        im = im.convert("RGB")
+    return im
 
 def load_image_fix(path: Path) -> Image.Image:
     with Image.open(path) as im:
-        im = ImageOps.exif_transpose(im)
-        if im.mode not in ("RGB","RGBA","L"):
-            im = im.convert("RGB")
-        if im.mode == "RGBA":
-            bg = Image.new("RGB", im.size, (0,0,0))
-            bg.paste(im, mask=im.split()[-1])
-            im = bg
-        icc = im.info.get("icc_profile")
-        if icc:
-            try:
-                srgb = ImageCms.createProfile("sRGB")
-                src = ImageCms.ImageCmsProfile(io.BytesIO(icc))
-                im = ImageCms.profileToProfile(im, src, srgb, outputMode="RGB")
-            except Exception:
-                im = im.convert("RGB")
-        else:
-            im = im.convert("RGB")
-        return im
+        return _normalize_loaded(im)
+
+def load_image_reduced(path: Path, max_side: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Decode at reduced scale: JPEG DCT scaling via draft() (1/2..1/8), reduce()
+    for other formats. Also returns the native, orientation-corrected size
+    read from the header.
+    """
+    with Image.open(path) as im:
+        w, h = im.size
+        native = (h, w) if im.getexif().get(0x0112, 1) in (5, 6, 7, 8) else (w, h)
+        long_side = max(w, h)
+        if long_side > max_side:
+            if im.format == "JPEG":
+                im.draft(im.mode, (max(1, w*max_side//long_side), max(1, h*max_side//long_side)))
+            elif long_side // max_side > 1:
+                im = im.reduce(long_side // max_side)
+        return _normalize_loaded(im), native
+
+def analysis_thresholds(sharp_target: float, noise_max: float, scale: float) -> Tuple[float, float]:
+    # Laplacian variance of a downscaled image grows by anywhere from ~1x (fine
+    # detail) to scale**-4 (soft detail); 1/scale splits the difference. Area
+    # averaging lowers the noise std roughly in proportion to the scale.
+    # This is only a first-order correction: how far the metrics move depends
+    # on the image content, so fast-scan scores are not comparable with
+    # full-resolution ones (items record their scan_mode).
+    if scale >= 1.0:
+        return sharp_target, noise_max
+    return sharp_target / scale, noise_max * scale
 
 def pil_to_cv(im: Image.Image) -> np.ndarray:
     return cv2.cvtColor(np.array(im), cv2.COLOR_RGB2BGR)
@@ -47,7 +82,79 @@ def histogram_contrast_score(cv_img_gray: np.ndarray) -> float:
     span = used_bins[-1] - used_bins[0] + 1
     return 100.0 * (span/256.0)
 
-def estimate_noise_std(cv_img_gray: np.ndarray) -> float:
+def _window_sums(a: np.ndarray, size: int, ys: np.ndarray, xs: np.ndarray):
+    # Sum and sum of squares over size x size windows anchored at (ys, xs)
+    kw = dict(ksize=(size, size), anchor=(0, 0), normalize=False, borderType=cv2.BORDER_CONSTANT)
+    grid = np.ix_(ys, xs)
+    return (cv2.boxFilter(a, cv2.CV_64F, **kw)[grid],
+            cv2.sqrBoxFilter(a, cv2.CV_64F, **kw)[grid])
+
+def _seg_sums(a: np.ndarray, starts: np.ndarray, n: int, axis: int):
+    # Sum and sum of squares of n-long runs along `axis` starting at `starts`
+    out = []
+    for v in (a.astype(np.float64), a.astype(np.float64)**2):
+        c = np.cumsum(v, axis=axis)
+        c = np.concatenate([np.zeros_like(c.take([0], axis=axis)), c], axis=axis)
+        out.append(c.take(starts+n, axis=axis) - c.take(starts, axis=axis))
+    return out
+
+def _noise_band(g: np.ndarray, ys: np.ndarray, xs: np.ndarray, k: int):
+    # Per-patch sum / sum of squares of the patch-local Laplacian (cv2 ksize=1,
+    # BORDER_REFLECT_101 at the patch edge) and of the pixels. Inside the patch
+    # the local Laplacian equals the global one; the one-pixel ring is rebuilt
+    # from its reflected neighbours.
+    s1, s2 = _window_sums(cv2.Laplacian(g, cv2.CV_32F, ksize=1), k-2, ys+1, xs+1)
+    yb, xr = ys + k - 1, xs + k - 1
+    f = g.astype(np.float32)
+    for rows, nb in ((ys, ys+1), (yb, yb-1)):
+        r, rn = f[rows], f[nb]
+        edge = np.zeros_like(r)
+        edge[:, 1:-1] = r[:, :-2] + r[:, 2:] - 2*r[:, 1:-1] + 2*(rn[:, 1:-1] - r[:, 1:-1])
+        e1, e2 = _seg_sums(edge, xs+1, k-2, 1)
+        s1 += e1; s2 += e2
+    for cols, nb in ((xs, xs+1), (xr, xr-1)):
+        c, cn = f[:, cols], f[:, nb]
+        edge = np.zeros_like(c)
+        edge[1:-1, :] = c[:-2, :] + c[2:, :] - 2*c[1:-1, :] + 2*(cn[1:-1, :] - c[1:-1, :])
+        e1, e2 = _seg_sums(edge, ys+1, k-2, 0)
+        s1 += e1; s2 += e2
+    px = lambda r, c: g[np.ix_(r, c)].astype(np.float64)
+    for ry, ry_n, cx, cx_n in ((ys, ys+1, xs, xs+1), (ys, ys+1, xr, xr-1),
+                               (yb, yb-1, xs, xs+1), (yb, yb-1, xr, xr-1)):
+        c = px(ry, cx)
+        corner = 2*(px(ry_n, cx) - c) + 2*(px(ry, cx_n) - c)
+        s1 += corner; s2 += corner**2
+    p1, p2 = _window_sums(g, k, ys, xs)
+    return s1, s2, p1, p2
+
+def estimate_noise_std(cv_img_gray: np.ndarray, band_rows: int = 32) -> float:
+    # Std of the flattest 32x32 patch (local Laplacian variance < 5) on a 16px
+    # grid, computed blockwise a band of patch rows at a time.
+    k = 32
+    stride = max(8, k//2)
+    H, W = cv_img_gray.shape
+    if H < k or W < k:
+        return float(cv_img_gray.std())
+    n = float(k*k)
+    xs = np.arange(0, W-k+1, stride)
+    all_ys = np.arange(0, H-k+1, stride)
+    best_std = np.inf
+    for r0 in range(0, len(all_ys), band_rows):
+        ys = all_ys[r0:r0+band_rows]
+        top = int(ys[0])
+        g = np.ascontiguousarray(cv_img_gray[top:int(ys[-1])+k])
+        s1, s2, p1, p2 = _noise_band(g, ys - top, xs, k)
+        # var < 5  <=>  n*sum(x^2) - sum(x)^2 < 5*n^2 ; exact on integer sums
+        flat = (n*s2 - s1*s1) < 5.0*n*n
+        if flat.any():
+            var = np.maximum(p2[flat]/n - (p1[flat]/n)**2, 0.0)
+            best_std = min(best_std, float(np.sqrt(var.min())))
+    if best_std == np.inf: best_std = float(cv_img_gray.std())
+    return best_std
+
+def estimate_noise_std_reference(cv_img_gray: np.ndarray) -> float:
+    # The original per-patch loop; estimate_noise_std must match it exactly
+    # (tests/test_noise_parity.py, `bench --noise`).
     k = 32
     H, W = cv_img_gray.shape
     best_std = 999.0
@@ -60,13 +167,41 @@ def estimate_noise_std(cv_img_gray: np.ndarray) -> float:
     if best_std == 999.0: best_std = float(cv_img_gray.std())
     return best_std
 
-def score_image(cv_img: np.ndarray, sharp_target=150.0, noise_max=12.0,
-                w_sharp=0.5, w_contrast=0.3, w_noise=0.2) -> Dict[str, float]:
+def benchmark_noise(grays: List[np.ndarray], repeat: int = 3) -> List[dict]:
+    """Best-of-`repeat` time of estimate_noise_std against the reference loop, per grayscale image."""
+    rows = []
+    for g in grays:
+        times, values = {}, {}
+        for name, fn in (("reference", estimate_noise_std_reference), ("vectorized", estimate_noise_std)):
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                values[name] = fn(g)
+                best = min(best, time.perf_counter() - t0)
+            times[name] = best
+        rows.append({
+            "shape": list(g.shape),
+            "reference_ms": round(1000 * times["reference"], 1),
+            "vectorized_ms": round(1000 * times["vectorized"], 1),
+            "speedup": round(times["reference"] / max(times["vectorized"], 1e-9), 1),
+            "abs_diff": abs(values["reference"] - values["vectorized"]),
+        })
+    return rows
+
+def measure_image(cv_img: np.ndarray) -> Dict[str, float]:
     gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-    lv = laplacian_variance(cv_img)
+    return {
+        "lap_variance": laplacian_variance(cv_img),
+        "contrast": histogram_contrast_score(gray),
+        "noise_std": estimate_noise_std(gray)
+    }
+
+def scores_from_metrics(metrics: Dict[str, float], sharp_target=150.0, noise_max=12.0,
+                        w_sharp=0.5, w_contrast=0.3, w_noise=0.2) -> Dict[str, float]:
+    lv = metrics["lap_variance"]
+    noise_std = metrics["noise_std"]
     sharp = min(100.0, (lv / sharp_target) * 100.0)
-    contrast = histogram_contrast_score(gray)
-    noise_std = estimate_noise_std(gray)
+    contrast = metrics["contrast"]
     noise_score = max(0.0, (1.0 - (noise_std / noise_max)) * 100.0)
     final = (w_sharp*sharp) + (w_contrast*contrast) + (w_noise*noise_score)
     return {
@@ -78,6 +213,10 @@ def score_image(cv_img: np.ndarray, sharp_target=150.0, noise_max=12.0,
         "noise_std": noise_std
     }
 
+def score_image(cv_img: np.ndarray, sharp_target=150.0, noise_max=12.0,
+                w_sharp=0.5, w_contrast=0.3, w_noise=0.2) -> Dict[str, float]:
+    return scores_from_metrics(measure_image(cv_img), sharp_target, noise_max, w_sharp, w_contrast, w_noise)
+
 def passes_basic_rules(w: int, h: int, min_side=1024, aspect_min=0.5, aspect_max=2.0) -> bool:
     if min(w,h) < min_side: return False
     aspect = (w/h) if h else 0
@@ -107,48 +246,70 @@ def auto_rotate(cv_img: np.ndarray) -> np.ndarray:
         return cv2.rotate(cv_img, cv2.ROTATE_90_CLOCKWISE)
     return cv_img
 
-def face_cascade_path() -> str:
-    import cv2 as _cv2
-    return str(Path(_cv2.data.haarcascades) / "haarcascade_frontalface_default.xml")
+def analyze_image(p: Path, fast: bool = False, analysis_side: int = 1024, loader=load_image_fix) -> dict:
+    """
+    Decode + analysis; returns a compact, cacheable record. In fast mode the
+    image is decoded at reduced scale and metrics, thumbnail and phash all
+    come from one buffer of at most analysis_side on the long edge. The
+    file's (size, mtime_ns) is taken before decoding, so a later change is
+    never mistaken for the analysed version.
+    """
+    st = os.stat(p)
+    if fast:
+        im, (w, h) = load_image_reduced(p, analysis_side)
+        if max(im.size) > analysis_side:
+            f = analysis_side / max(im.size)
+            im = im.resize((max(1, round(im.width*f)), max(1, round(im.height*f))), Image.Resampling.BOX)
+        scale = min(1.0, max(im.size) / max(w, h))
+    else:
+        im = loader(p)
+        w, h = im.size
+        scale = 1.0
+    thumb_im = im.copy()
+    thumb_im.thumbnail((180, 180))
+    if thumb_im.mode != "RGB":
+        thumb_im = thumb_im.convert("RGB")
+    hsh = str(imagehash.phash(im, hash_size=16))
+    cv_rot = auto_rotate(pil_to_cv(im))
+    return {
+        "width": w, "height": h, "phash": hsh, "metrics": measure_image(cv_rot),
+        "analysis_scale": scale, "signature": (st.st_size, st.st_mtime_ns),
+        "thumb": thumb_im.tobytes(), "thumb_size": thumb_im.size
+    }
+
+def analyze_batch(paths: List[str], fast: bool = False, analysis_side: int = 1024) -> List[Tuple[str, Optional[dict]]]:
+    # Process-pool entry point: plain paths in, compact records out
+    out = []
+    for path in paths:
+        try:
+            out.append((path, analyze_image(Path(path), fast, analysis_side)))
+        except Exception:
+            out.append((path, None))
+    return out
 
 def detect_face_rect(cv_img: np.ndarray):
-    cascade = cv2.CascadeClassifier(face_cascade_path())
-    gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-    faces = cascade.detectMultiScale(gray, 1.2, 5, minSize=(64,64))
-    if len(faces) == 0: return None
-    x,y,w,h = max(faces, key=lambda r: r[2]*r[3])
-    return (x,y,w,h)
+    det = HaarFaceDetector().detect(cv_img, 1.0)
+    return det.bbox if det else None
 
 def saliency_center(cv_img: np.ndarray):
-    sal = cv2.saliency.StaticSaliencySpectralResidual_create()
-    ok, salmap = sal.computeSaliency(cv_img)
     h,w = cv_img.shape[:2]
-    if not ok:
-        side = min(h,w); x=(w-side)//2; y=(h-side)//2
-        return (x,y,side,side)
-    salmap = (salmap*255).astype("uint8")
-    m = cv2.moments(salmap)
-    cx = int(m["m10"]/m["m00"]) if m["m00"] != 0 else w//2
-    cy = int(m["m01"]/m["m00"]) if m["m00"] != 0 else h//2
-    side = min(h,w)
-    x = max(0, min(w-side, cx - side//2))
-    y = max(0, min(h-side, cy - side//2))
+    det = SaliencyDetector().detect(cv_img, 1.0)
+    if det is None:
+        det = Detection((0, 0, w, h), 0.0, "center")
+    x, y, side = det.crop_square(w, h)
     return (x,y,side,side)
 
-def intelligent_square_crop(cv_img: np.ndarray, target: int=1024) -> np.ndarray:
+def intelligent_square_crop(cv_img: np.ndarray, target: int=1024, detection: Detection|None=None) -> np.ndarray:
     h,w = cv_img.shape[:2]
     scale = target / max(h,w)
     if scale < 1.0:
         cv_img = cv2.resize(cv_img, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_LANCZOS4)
-        h,w = cv_img.shape[:2]
-    r = detect_face_rect(cv_img)
-    if r is None:
-        x,y,side,side = saliency_center(cv_img)
+    h2,w2 = cv_img.shape[:2]
+    if detection is None:
+        detection = subject_detector().detect(cv_img)
     else:
-        x,y,fw,fh = r
-        side = min(max(fw, fh)*2, min(h,w))
-        x = max(0, min(w-side, x + fw//2 - side//2))
-        y = max(0, min(h-side, y + fh//2 - side//2))
+        detection = detection.scaled(w2 / w, h2 / h)
+    x,y,side = detection.crop_square(w2, h2)
     crop = cv_img[y:y+side, x:x+side]
     if crop.shape[0] != target:
         crop = cv2.resize(crop, (target,target), interpolation=cv2.INTER_LANCZOS4)
@@ -180,8 +341,7 @@ def auto_fix_to_standard(cv_img: np.ndarray,
                          min_side=1024, aspect_min=0.5, aspect_max=2.0):
     pre = score_image(cv_img, sharp_target, noise_max, w_sharp, w_contrast, w_noise)
 
-    gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-    noise_std = estimate_noise_std(gray)
+    noise_std = pre["noise_std"]
     if noise_std > (noise_max * 0.75):
         cv_img = cv2.fastNlMeansDenoisingColored(cv_img, None, 3, 3, 7, 21)
 
@@ -224,27 +384,14 @@ def minside_upscale_guarded(cv_img: np.ndarray, min_side=1024, max_factor=2.0) -
     return cv2.resize(cv_img, (nw, nh), interpolation=cv2.INTER_LANCZOS4)
 
 def clear_metadata_pillow(im: Image.Image) -> Image.Image:
-    data = list(im.getdata())
-    new = Image.new(im.mode, im.size)
-    new.putdata(data)
+    """Same pixels without info/EXIF; use metadata.strip_metadata for encoded files."""
+    new = Image.frombytes(im.mode, im.size, im.tobytes())
+    if im.mode == "P":
+        new.putpalette(im.getpalette())
     return new
 
 def apply_exif_template_jpeg(img_bytes: bytes, template: dict) -> bytes:
     try:
-        import piexif
-    except Exception:
-        return img_bytes
-    try:
-        exif_dict = {"0th":{}, "Exif":{}, "GPS":{}, "1st":{}, "thumbnail":None}
-        if template.get("Artist"):
-            exif_dict["0th"][piexif.ImageIFD.Artist] = template["Artist"].encode("utf-8")
-        if template.get("Copyright"):
-            exif_dict["0th"][piexif.ImageIFD.Copyright] = template["Copyright"].encode("utf-8")
-        if template.get("ImageDescription"):
-            exif_dict["0th"][piexif.ImageIFD.ImageDescription] = template["ImageDescription"].encode("utf-8")
-        if template.get("UserComment"):
-            exif_dict["Exif"][piexif.ExifIFD.UserComment] = template["UserComment"].encode("utf-8")
-        exif_bytes = piexif.dump(exif_dict)
-        return piexif.insert(exif_bytes, img_bytes)
+        return inject_metadata(img_bytes, template)
     except Exception:
         return img_bytes
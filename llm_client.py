@@ -0,0 +1,133 @@
+import json, time, socket, threading, http.client
+from collections import deque
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+class LLMError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class LLMClient:
+    """
+    Keep-alive JSON POST client for one OpenAI-compatible endpoint.
+    At most max_in_flight requests run at once (callers block for a slot);
+    5xx responses, timeouts and dropped connections are retried with
+    exponential backoff. Idle connections are reused across threads.
+    """
+    def __init__(self, endpoint: str, max_in_flight: int = 2, retries: int = 3, backoff: float = 0.5):
+        u = urlsplit(endpoint)
+        self.endpoint = endpoint
+        self.https = u.scheme == "https"
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or (443 if self.https else 80)
+        self.path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_in_flight = max(1, max_in_flight)
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.lock = threading.Lock()
+        self.idle: List[http.client.HTTPConnection] = []
+        self.latencies = deque(maxlen=1000)
+        self.counts = {"requests": 0, "errors": 0, "retries": 0}
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _release(self, conn: http.client.HTTPConnection):
+        with self.lock:
+            if len(self.idle) < self.max_in_flight:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def post_json(self, body: dict, timeout: float = 60) -> dict:
+        data = json.dumps(body).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        last: Exception | None = None
+        with self.slots:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    with self.lock:
+                        self.counts["retries"] += 1
+                    time.sleep(self.backoff * (2 ** (attempt - 1)))
+                conn = self._connect(timeout)
+                t0 = time.perf_counter()
+                try:
+                    conn.request("POST", self.path, body=data, headers=headers)
+                    resp = conn.getresponse()
+                    payload = resp.read()
+                except (socket.timeout, ConnectionError, http.client.HTTPException, OSError) as e:
+                    conn.close()
+                    last = e
+                    continue
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if resp.status >= 500:
+                    last = LLMError(resp.status, payload[:200].decode("utf-8", "replace"))
+                    continue
+                with self.lock:
+                    self.counts["requests"] += 1
+                    self.latencies.append(time.perf_counter() - t0)
+                if resp.status >= 400:
+                    raise LLMError(resp.status, payload[:200].decode("utf-8", "replace"))
+                return json.loads(payload.decode("utf-8"))
+        with self.lock:
+            self.counts["errors"] += 1
+        raise last if last else LLMError(0, "request failed")
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lat = sorted(self.latencies)
+            out = dict(self.counts)
+        if lat:
+            out.update({
+                "latency_mean_s": round(sum(lat) / len(lat), 3),
+                "latency_p50_s": round(lat[len(lat) // 2], 3),
+                "latency_p95_s": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 3),
+                "latency_max_s": round(lat[-1], 3),
+            })
+        return out
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(endpoint: str) -> LLMClient:
+    with _clients_lock:
+        client = _clients.get(endpoint)
+        if client is None:
+            client = _clients[endpoint] = LLMClient(endpoint)
+        return client
+
+def configure_client(lm_settings: dict) -> LLMClient:
+    """(Re)creates the shared client for lm_settings["endpoint"] with its limits."""
+    endpoint = lm_settings.get("endpoint", "")
+    client = LLMClient(endpoint,
+                       max_in_flight=int(lm_settings.get("max_in_flight", 2)),
+                       retries=int(lm_settings.get("retries", 3)),
+                       backoff=float(lm_settings.get("retry_backoff", 0.5)))
+    with _clients_lock:
+        old = _clients.get(endpoint)
+        if old is not None and (old.max_in_flight, old.retries, old.backoff) == \
+                (client.max_in_flight, client.retries, client.backoff):
+            return old
+        _clients[endpoint] = client
+    if old is not None:
+        old.close()
+    return client
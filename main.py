@@ -2,17 +2,22 @@
 import sys
 from pathlib import Path
 
-from PySide6.QtCore import Qt, QSize, Slot
+from PySide6.QtCore import Qt, QSize, Slot, QThread
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QProgressBar, QSplitter, QComboBox, QMessageBox, QCheckBox, QSpinBox, QLineEdit
 )
 
-from ui_components import ThumbnailGallery, CropOverlay
-from worker import ScanManager, ScanConfig, ExportManager, VLMCropManager
+from ui_components import ThumbnailGallery, CropOverlay, item_thumbnail
+from worker import ScanManager, ExportManager, VLMCropManager, scan_config_from_settings
 from vlm_cropper_dialog import VLMCropperDialog
-from PySide6.QtGui import QPixmap, QAction
+from PySide6.QtGui import QPixmap, QImage, QAction
 from utils import AppSettings
+from image_cache import shared_image_cache
+from export_journal import JOURNAL_NAME
+from preview_loader import PreviewLoader
+from watcher import FolderWatcher
+from subject_detection import configure_subject_detector
 from settings_dialog import SettingsDialog
 
 class MainWindow(QMainWindow):
@@ -22,9 +27,17 @@ class MainWindow(QMainWindow):
         self.resize(1400, 860)
 
         self.items = []
-        self.filtered = []
         self.current = None
+        self.folder = None
+        self.scan_manager = None
+        self.scanning = False
+        self.watcher = None
+        self.last_export_dir = None
+        self.export_pending = False
         self.settings = AppSettings(Path.home() / ".jewels_settings.json")
+        shared_image_cache().set_budget(self.settings.data.get("decoded_cache_mb", 1024))
+        configure_subject_detector(self.settings.data.get("subject_detectors", "haar_face,saliency"),
+                                   self.settings.data.get("detect_proxy_side", 512))
         self.export_manager = None
         self.vlm_crop_manager = None
 
@@ -51,6 +64,10 @@ class MainWindow(QMainWindow):
         self.exclude_edit.setPlaceholderText("exclude globs e.g. */screenshots/*, *memes*")
         self.exclude_edit.setText(self.settings.data.get("exclude_globs", ""))
 
+        self.watch_chk = QCheckBox("Watch folder")
+        self.watch_chk.setChecked(self.settings.data.get("watch", False))
+        self.watch_chk.toggled.connect(self.toggle_watch)
+
         export_btn = QPushButton("Export (triage)")
         export_btn.clicked.connect(self.export_all)
 
@@ -59,6 +76,7 @@ class MainWindow(QMainWindow):
 
         top = QHBoxLayout()
         top.addWidget(open_btn)
+        top.addWidget(self.watch_chk)
         top.addWidget(settings_btn)
         top.addStretch(1)
         top.addWidget(QLabel("Filter:")); top.addWidget(self.filter_box)
@@ -74,10 +92,13 @@ class MainWindow(QMainWindow):
         vlm_crop_btn.clicked.connect(self.open_vlm_cropper)
         top.addWidget(vlm_crop_btn)
 
-        self.gallery = ThumbnailGallery()
-        self.gallery.itemSelectionChanged.connect(self.on_select)
+        self.gallery = ThumbnailGallery(cache_items=self.settings.data.get("thumb_cache_items", 2000))
+        self.gallery.selection_changed.connect(self.on_select)
+        self.gallery.viewport_changed.connect(self.prioritize_visible)
 
         self.preview = CropOverlay()
+        self.previews = PreviewLoader(cache_items=self.settings.data.get("preview_cache_items", 32), parent=self)
+        self.previews.ready.connect(self.on_preview_ready)
         right = QVBoxLayout()
         self.preview_label = QLabel("Review Panel")
         right.addWidget(self.preview_label)
@@ -90,6 +111,10 @@ class MainWindow(QMainWindow):
 
         self.progress = QProgressBar()
         self.statusBar().addPermanentWidget(self.progress, 1)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_jobs)
+        self.statusBar().addPermanentWidget(self.cancel_btn)
 
         central = QWidget(); lay = QVBoxLayout(central)
         lay.addLayout(top); lay.addWidget(split, 1)
@@ -101,27 +126,66 @@ class MainWindow(QMainWindow):
         self.scan_folder(Path(folder))
 
     def scan_folder(self, folder: Path):
-        self.items.clear(); self.filtered.clear(); self.gallery.clear()
-
-        cfg = ScanConfig(
+        self.stop_watch()
+        if self.scanning:
+            self._detach_scan()
+            self.scan_manager.cancel()
+        self.folder = folder
+        self.items.clear(); self.gallery.clear()
+
+        # the widgets override what the settings file says
+        cfg = scan_config_from_settings(
+            self.settings.data,
             pass_threshold=float(self.pass_spin.value()),
             sel_min_score=float(self.selmin_spin.value()),
             include_globs=self.include_edit.text().strip(),
             exclude_globs=self.exclude_edit.text().strip(),
-            dedupe_tol=self.settings.data.get("dedupe_tol", 8),
-            w_sharp=self.settings.data.get("w_sharp", 0.5),
-            w_contrast=self.settings.data.get("w_contrast", 0.3),
-            w_noise=self.settings.data.get("w_noise", 0.2),
-            blur_target=self.settings.data.get("blur_target", 150.0),
-            noise_max=self.settings.data.get("noise_max", 12.0),
         )
         self.scan_manager = ScanManager(folder, cfg)
         self.scan_manager.image_scanned.connect(self.on_item)
+        self.scan_manager.found.connect(self.gallery.add_pending)
         self.scan_manager.progress.connect(self.on_progress)
         self.scan_manager.finished.connect(self.on_finished)
+        self.scan_manager.updated.connect(self.on_scan_updated)
         self.progress.setValue(0); self.progress.setFormat("Scanning %p%")
+        self.scanning = True
+        self.update_cancel()
         self.scan_manager.run()
 
+    def _detach_scan(self):
+        """Disconnects the running scan so a cancelled one cannot write into the next."""
+        m = self.scan_manager
+        for sig, slot in ((m.image_scanned, self.on_item), (m.found, self.gallery.add_pending),
+                          (m.progress, self.on_progress), (m.finished, self.on_finished),
+                          (m.updated, self.on_scan_updated)):
+            sig.disconnect(slot)
+        self.scanning = False
+
+    def cancel_jobs(self):
+        """Cancels the running scan, export and VLM crop; each finishes with what it completed."""
+        self.statusBar().showMessage("Cancelling…")
+        self.export_pending = False
+        if self.scanning:
+            self.scan_manager.cancel()
+        if self.export_manager is not None:
+            self.export_manager.cancel()
+        if self.vlm_crop_manager is not None:
+            self.vlm_crop_manager.cancel()
+
+    def update_cancel(self):
+        self.cancel_btn.setEnabled(self.scanning or self.export_manager is not None
+                                   or self.vlm_crop_manager is not None)
+
+    def prioritize_visible(self):
+        """Unscanned files on screen (and a selected unscanned one) are analysed next."""
+        if not self.scanning:
+            return
+        paths = [it["path"] for it in self.gallery.visible_items() if it.get("pending")]
+        cur = self.gallery.current_item()
+        if cur and cur.get("pending"):
+            paths.append(cur["path"])
+        self.scan_manager.prioritize(paths)
+
     def export_all(self):
         if not self.items:
             QMessageBox.information(self, "Export", "Nothing to export yet."); return
@@ -131,8 +195,18 @@ class MainWindow(QMainWindow):
         to_export = [it for it in self.items if it.get("status") in ("PASS","FAIL","DUPLICATE")]
         if not to_export:
             QMessageBox.information(self, "Export", "No items to export."); return
-
-        cfg = ScanConfig(
+        resume = False
+        if (Path(out) / JOURNAL_NAME).exists():
+            resume = QMessageBox.question(
+                self, "Export", "This folder has an unfinished or earlier export.\n"
+                "Resume it (skip images already exported with the same settings)?"
+            ) == QMessageBox.Yes
+        self.start_export(to_export, Path(out), resume)
+
+    def start_export(self, to_export, out: Path, resume: bool):
+        self.last_export_dir = out
+        cfg = scan_config_from_settings(
+            self.settings.data,
             pass_threshold=float(self.pass_spin.value()),
             sel_min_score=float(self.selmin_spin.value()),
             include_globs=self.include_edit.text().strip(),
@@ -140,53 +214,135 @@ class MainWindow(QMainWindow):
         )
         self.export_manager = ExportManager(
             to_export,
-            Path(out),
+            out,
             buckets=self.settings.data.get("buckets", [1024, 1152, 1216]),
             apply_autofix=self.autofix_chk.isChecked(),
             cfg=cfg,
             lm_settings=self.settings.data.get("lmstudio", {}),
             metadata_template=self.settings.data.get("metadata_template", {}),
-            enable_intelligent_crop=self.settings.data.get("enable_intelligent_crop", True)
+            enable_intelligent_crop=self.settings.data.get("enable_intelligent_crop", True),
+            resume=resume,
+            text_reports=self.settings.data.get("text_reports", False),
+            placement=self.settings.data.get("placement", "hardlink"),
+            output_profile=self.settings.data.get("output_profile", "png")
         )
         self.export_manager.progress.connect(self.on_progress)
+        self.export_manager.caption_progress.connect(self.on_caption_progress)
         self.export_manager.finished.connect(self.on_export_done)
         self.progress.setValue(0); self.progress.setFormat("Exporting %p%")
+        self.update_cancel()
         self.export_manager.run()
 
     def on_progress(self, done, total):
         self.progress.setMaximum(total); self.progress.setValue(done)
 
+    def on_caption_progress(self, done, total):
+        self.statusBar().showMessage(f"Captioning {done}/{total}")
+
     def on_item(self, item: dict):
         self.items.append(item)
-        mode = self.filter_box.currentText()
-        if mode == "All" or item.get("status") == mode:
-            self.filtered.append(item)
-            self.gallery.add_thumb(item)
+        self.gallery.add_thumb(item)
 
     def on_finished(self, results):
+        self.scanning = False
+        self.update_cancel()
         self.items = results
-        self.apply_filter()
+        self.gallery.populate(results)
+        if self.scan_manager.token.cancelled:
+            self.statusBar().showMessage(f"Scan cancelled: {len(results)} of {self.scan_manager.total} items", 5000)
+            return
         self.statusBar().showMessage(f"Scan complete: {len(results)} items", 5000)
+        if self.watch_chk.isChecked():
+            self.start_watch()
 
     def on_export_done(self, out_path):
+        cancelled = self.export_manager.cancelled if self.export_manager is not None else 0
+        self.export_manager = None
+        self.update_cancel()
+        if cancelled:
+            self.statusBar().showMessage(f"Export cancelled ({cancelled} items not exported); resume to finish", 5000)
+            return
         self.statusBar().showMessage(f"Exported to {out_path}", 5000)
+        if self.export_pending:
+            self.export_pending = False
+            self.export_changes()
+
+    def toggle_watch(self, on: bool):
+        if not on:
+            self.stop_watch()
+        elif self.scan_manager is not None and self.scan_manager.by_path and not self.scan_manager.token.cancelled:
+            # a cancelled scan's unscanned files would never be picked up
+            self.start_watch()
+
+    def start_watch(self):
+        self.stop_watch()
+        self.watcher = FolderWatcher(self.folder, self.settings.data.get("watch_interval", 2.0),
+                                     self.settings.data.get("watch_backend", "auto"))
+        self.watcher.changes.connect(self.on_watch_changes)
+        self.watcher.start(self.scan_manager.signatures())
+        self.statusBar().showMessage(f"Watching {self.folder} ({self.watcher.backend_name})", 5000)
+
+    def stop_watch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def on_watch_changes(self, changed, deleted):
+        self.statusBar().showMessage(f"Rescanning {len(changed)} changed, {len(deleted)} deleted", 3000)
+        self.scan_manager.rescan(changed, deleted)
+
+    def on_scan_updated(self, changed, removed):
+        self.items = self.scan_manager.results
+        self.gallery.update_items(changed, removed)
+        self.statusBar().showMessage(f"Updated {len(changed)} items, removed {len(removed)}", 5000)
+        if self.settings.data.get("watch_export", False) and self.last_export_dir is not None:
+            self.export_changes()
+
+    def export_changes(self):
+        """Re-exports into the last export folder; the journal skips everything unchanged."""
+        if self.export_manager is not None:
+            self.export_pending = True
+            return
+        to_export = [it for it in self.items if it.get("status") in ("PASS","FAIL","DUPLICATE")]
+        if to_export:
+            self.start_export(to_export, self.last_export_dir, resume=True)
+
+    def closeEvent(self, e):
+        self.stop_watch()
+        # running jobs stop early; an interrupted export stays resumable
+        self.cancel_jobs()
+        super().closeEvent(e)
 
     def apply_filter(self):
-        mode = self.filter_box.currentText()
-        self.filtered = self.items[:] if mode == "All" else [it for it in self.items if it.get("status")==mode]
-        self.gallery.populate(self.filtered)
+        self.gallery.set_filter(self.filter_box.currentText())
 
     def on_select(self):
-        sel = self.gallery.selectedItems()
-        if not sel: self.current=None; return
-        name = sel[0].text()
-        for it in self.filtered:
-            if it["name"] == name: self.current = it; break
+        self.current = self.gallery.current_item()
+        if self.current and self.current.get("pending"):
+            # not scanned yet: move it to the front of the queue
+            self.prioritize_visible()
+            self.preview_label.setText(f"{self.current['name']} — scanning…")
+            self.current = None
+            return
         if self.current:
-            pm = QPixmap(self.current["path"]).scaled(QSize(720,720), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.preview.set_pixmap(pm)
+            n = self.settings.data.get("preview_prefetch", 2)
+            neighbours = [it["path"] for it in self.gallery.neighbour_items(n) if not it.get("pending")]
+            hit = self.previews.request(self.current["path"], neighbours)
+            if hit is not None:
+                self.on_preview_ready(self.current["path"], *hit)
+            else:
+                # Upscaled thumbnail until the reduced decode arrives
+                pm = QPixmap.fromImage(item_thumbnail(self.current))
+                self.preview.set_pixmap(pm.scaled(QSize(720,720), Qt.KeepAspectRatio, Qt.SmoothTransformation))
             self.preview_label.setText(f"{self.current['name']} — {self.current['status']} | score: {self.current['scores']['final']:.1f}")
 
+    def on_preview_ready(self, path: str, qimg: QImage, det):
+        if not self.current or self.current["path"] != path:
+            return
+        self.preview.set_pixmap(QPixmap.fromImage(qimg))
+        if det is not None:
+            self.preview.set_subject(det)
+
     def open_settings(self):
         dialog = SettingsDialog(self.settings, self)
         if dialog.exec():
@@ -197,6 +353,9 @@ class MainWindow(QMainWindow):
             self.include_edit.setText(self.settings.data.get("include_globs", ""))
             self.exclude_edit.setText(self.settings.data.get("exclude_globs", ""))
             self.autofix_chk.setChecked(self.settings.data.get("autofix", True))
+            shared_image_cache().set_budget(self.settings.data.get("decoded_cache_mb", 1024))
+            configure_subject_detector(self.settings.data.get("subject_detectors", "haar_face,saliency"),
+                                       self.settings.data.get("detect_proxy_side", 512))
             self.statusBar().showMessage("Settings saved.", 3000)
 
     def open_vlm_cropper(self):
@@ -227,6 +386,7 @@ class MainWindow(QMainWindow):
 
         self.progress.setValue(0)
         self.progress.setFormat("VLM Cropping... %p%")
+        self.update_cancel()
         self.vlm_crop_thread.start()
 
     @Slot(int, int)
@@ -236,9 +396,11 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def on_vlm_finished(self):
-        self.statusBar().showMessage("VLM Cropping complete.", 5000)
+        cancelled = self.vlm_crop_manager is not None and self.vlm_crop_manager.token.cancelled
+        self.statusBar().showMessage("VLM Cropping cancelled." if cancelled else "VLM Cropping complete.", 5000)
         self.progress.setFormat("Idle")
         self.vlm_crop_manager = None
+        self.update_cancel()
 
 def headless_main(folder: Path):
     from worker import ScanManager, ScanConfig
@@ -270,6 +432,10 @@ def headless_main(folder: Path):
     app.exec()
 
 def main():
+    from cli import COMMANDS
+    if len(sys.argv) > 1 and (sys.argv[1] in COMMANDS or sys.argv[1].startswith("-")):
+        import cli
+        sys.exit(cli.main(sys.argv[1:]))
     if len(sys.argv) > 1:
         folder_path = Path(sys.argv[1])
         if folder_path.is_dir():
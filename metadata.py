@@ -0,0 +1,277 @@
+import io, os, shutil, struct, tempfile, zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+# Container-level metadata editing: segments/chunks are copied or dropped as
+# they stream past, pixel data is never decoded. ICC profiles are kept.
+
+PNG_SIG = b"\x89PNG\r\n\x1a\n"
+PNG_META_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+XMP_JPEG_NS = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_EXT_JPEG_NS = b"http://ns.adobe.com/xmp/extension/\x00"
+COPY_BLOCK = 1 << 20
+
+TEMPLATE_KEYS = ("Artist", "Copyright", "ImageDescription", "UserComment")
+# PNG text keywords used for the template (registered tEXt keywords)
+PNG_TEXT_KEYS = {"Artist": "Artist", "Copyright": "Copyright", "ImageDescription": "Description", "UserComment": "Comment"}
+
+def _read(f: BinaryIO, n: int) -> bytes:
+    b = f.read(n)
+    if len(b) != n:
+        raise ValueError("truncated image data")
+    return b
+
+def _copy(fin: BinaryIO, fout: BinaryIO, n: int):
+    while n > 0:
+        b = _read(fin, min(n, COPY_BLOCK))
+        fout.write(b)
+        n -= len(b)
+
+def _template(template: dict|None) -> Dict[str, str]:
+    return {k: str(template[k]) for k in TEMPLATE_KEYS if template and template.get(k)}
+
+# --- builders ---------------------------------------------------------------
+
+def _ifd(entries: List[Tuple[int, int, int, bytes]], offset: int) -> bytes:
+    """Big-endian TIFF IFD at `offset`; values over 4 bytes follow the IFD."""
+    head = struct.pack(">H", len(entries))
+    data_off = offset + 2 + 12 * len(entries) + 4
+    body, extra = b"", b""
+    for tag, typ, count, value in sorted(entries):
+        if len(value) <= 4:
+            body += struct.pack(">HHI", tag, typ, count) + value.ljust(4, b"\0")
+        else:
+            body += struct.pack(">HHII", tag, typ, count, data_off + len(extra))
+            extra += value + (b"\0" if len(value) % 2 else b"")
+    return head + body + struct.pack(">I", 0) + extra
+
+def build_exif(template: dict) -> bytes:
+    """TIFF-structured EXIF block (no "Exif\\0\\0" prefix) for the template fields."""
+    t = _template(template)
+    ascii_tags = {"ImageDescription": 0x010E, "Artist": 0x013B, "Copyright": 0x8298}
+    ifd0 = []
+    for key, tag in ascii_tags.items():
+        if key in t:
+            v = t[key].encode("utf-8") + b"\0"
+            ifd0.append((tag, 2, len(v), v))
+    exif_ifd = []
+    if "UserComment" in t:
+        try:
+            v = b"ASCII\0\0\0" + t["UserComment"].encode("ascii")
+        except UnicodeEncodeError:
+            v = b"UNICODE\0" + t["UserComment"].encode("utf-16-be")
+        exif_ifd.append((0x9286, 7, len(v), v))
+    if not ifd0 and not exif_ifd:
+        return b""
+    if exif_ifd:
+        ifd0.append((0x8769, 4, 1, b"\0\0\0\0"))
+    first = _ifd(ifd0, 8)
+    if exif_ifd:
+        ptr = 8 + len(first)
+        ifd0[-1] = (0x8769, 4, 1, struct.pack(">I", ptr))
+        first = _ifd(ifd0, 8) + _ifd(exif_ifd, ptr)
+    return b"MM\0*" + struct.pack(">I", 8) + first
+
+def build_xmp(template: dict) -> bytes:
+    t = {k: escape(v) for k, v in _template(template).items()}
+    if not t:
+        return b""
+    alt = lambda v: f'<rdf:Alt><rdf:li xml:lang="x-default">{v}</rdf:li></rdf:Alt>'
+    props = ""
+    if "Artist" in t:
+        props += f"<dc:creator><rdf:Seq><rdf:li>{t['Artist']}</rdf:li></rdf:Seq></dc:creator>"
+    if "Copyright" in t:
+        props += f"<dc:rights>{alt(t['Copyright'])}</dc:rights>"
+    if "ImageDescription" in t:
+        props += f"<dc:description>{alt(t['ImageDescription'])}</dc:description>"
+    if "UserComment" in t:
+        props += f"<exif:UserComment>{alt(t['UserComment'])}</exif:UserComment>"
+    return (
+        '<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>'
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+        '<rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        'xmlns:exif="http://ns.adobe.com/exif/1.0/">' + props +
+        '</rdf:Description></rdf:RDF></x:xmpmeta><?xpacket end="w"?>'
+    ).encode("utf-8")
+
+# --- JPEG --------------------------------------------------------------------
+
+def _jpeg_segment(marker: int, payload: bytes) -> bytes:
+    if len(payload) > 65533:
+        raise ValueError("metadata segment too large for JPEG")
+    return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+def _jpeg(fin, fout, strip: bool, exif: bytes, xmp: bytes):
+    fout.write(_read(fin, 2))
+    inject = (_jpeg_segment(0xE1, b"Exif\0\0" + exif) if exif else b"") + \
+             (_jpeg_segment(0xE1, XMP_JPEG_NS + xmp) if xmp else b"")
+    pending = True
+    while True:
+        b = _read(fin, 1)
+        if b != b"\xff":
+            raise ValueError("bad JPEG marker")
+        m = _read(fin, 1)[0]
+        while m == 0xFF:
+            m = _read(fin, 1)[0]
+        if m in (0xDA, 0xD9):  # start of scan / end: rest is entropy-coded data
+            if pending:
+                fout.write(inject)
+            fout.write(bytes((0xFF, m)))
+            shutil.copyfileobj(fin, fout, COPY_BLOCK)
+            return
+        if m == 0x01 or 0xD0 <= m <= 0xD7:
+            fout.write(bytes((0xFF, m)))
+            continue
+        (length,) = struct.unpack(">H", _read(fin, 2))
+        if pending and m != 0xE0:  # keep JFIF APP0 first
+            fout.write(inject)
+            pending = False
+        if m in (0xE1, 0xED, 0xFE):
+            payload = _read(fin, length - 2)
+            is_exif = m == 0xE1 and payload.startswith(b"Exif\0\0")
+            is_xmp = m == 0xE1 and payload.startswith((XMP_JPEG_NS, XMP_EXT_JPEG_NS))
+            if strip or (is_exif and exif) or (is_xmp and xmp):
+                continue
+            fout.write(_jpeg_segment(m, payload))
+        else:
+            fout.write(struct.pack(">BBH", 0xFF, m, length))
+            _copy(fin, fout, length - 2)
+
+# --- PNG ---------------------------------------------------------------------
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+def png_text_chunk(key: str, value: str) -> bytes:
+    """tEXt chunk, or iTXt when the value is not Latin-1."""
+    try:
+        return _png_chunk(b"tEXt", key.encode("latin-1") + b"\0" + value.encode("latin-1"))
+    except UnicodeEncodeError:
+        return _png_chunk(b"iTXt", key.encode("latin-1", "replace") + b"\0\0\0\0\0" + value.encode("utf-8"))
+
+def _png(fin, fout, strip: bool, template: Dict[str, str], exif: bytes, xmp: bytes):
+    fout.write(_read(fin, 8))
+    inject = b"".join(png_text_chunk(PNG_TEXT_KEYS[k], v) for k, v in template.items())
+    if exif:
+        inject += _png_chunk(b"eXIf", exif)
+    if xmp:
+        inject += _png_chunk(b"iTXt", b"XML:com.adobe.xmp\0\0\0\0\0" + xmp)
+    # without strip only the entries being replaced are dropped (keeps e.g. generation "parameters")
+    replaced = {PNG_TEXT_KEYS[k].encode("latin-1") for k in template} | ({b"XML:com.adobe.xmp"} if xmp else set())
+    while True:
+        head = fin.read(8)
+        if not head:
+            return
+        length, kind = struct.unpack(">I4s", head)
+        if kind in PNG_META_CHUNKS:
+            data = _read(fin, length + 4)
+            if strip or (kind == b"eXIf" and exif) or data[:length].split(b"\0", 1)[0] in replaced:
+                continue
+            fout.write(head + data)
+            continue
+        fout.write(head)
+        _copy(fin, fout, length + 4)
+        if kind == b"IHDR":
+            fout.write(inject)
+
+# --- WebP --------------------------------------------------------------------
+
+def _webp_canvas(kind: bytes, data: bytes) -> Tuple[int, int, bool]:
+    if kind == b"VP8L":
+        bits = int.from_bytes(data[1:5], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, bool((bits >> 28) & 1)
+    w, h = struct.unpack("<HH", data[6:10])
+    return w & 0x3FFF, h & 0x3FFF, False
+
+def _webp(fin, fout, strip: bool, exif: bytes, xmp: bytes):
+    riff = _read(fin, 12)
+    if riff[8:12] != b"WEBP":
+        raise ValueError("not a WebP file")
+    chunks = []  # (fourcc, size, offset of payload)
+    while True:
+        head = fin.read(8)
+        if len(head) < 8:
+            break
+        kind, size = struct.unpack("<4sI", head)
+        chunks.append((kind, size, fin.tell()))
+        fin.seek(size + (size & 1), io.SEEK_CUR)
+    drop = {b"EXIF", b"XMP "} if (strip or exif or xmp) else set()
+    kept = [c for c in chunks if c[0] not in drop]
+    extra = [(b"EXIF", exif), (b"XMP ", xmp)]
+    extra = [(k, v) for k, v in extra if v]
+    if not strip:
+        for k, size, off in chunks:
+            if k in (b"EXIF", b"XMP ") and not any(e[0] == k for e in extra):
+                fin.seek(off)
+                extra.append((k, _read(fin, size)))
+    flags = (0x08 if any(k == b"EXIF" for k, _ in extra) else 0) | (0x04 if any(k == b"XMP " for k, _ in extra) else 0)
+    vp8x = None
+    if kept and kept[0][0] == b"VP8X":
+        fin.seek(kept[0][2])
+        hdr = bytearray(_read(fin, kept[0][1]))
+        hdr[0] = (hdr[0] & ~0x0C) | flags
+        vp8x, kept = bytes(hdr), kept[1:]
+    elif flags:
+        kind, size, off = kept[0]
+        fin.seek(off)
+        w, h, alpha = _webp_canvas(kind, _read(fin, min(size, 10)))
+        vp8x = bytes((flags | (0x10 if alpha else 0), 0, 0, 0)) + (w - 1).to_bytes(3, "little") + (h - 1).to_bytes(3, "little")
+    pad = lambda n: n + (n & 1)
+    total = 4 + (8 + pad(len(vp8x)) if vp8x is not None else 0) \
+        + sum(8 + pad(size) for _, size, _ in kept) + sum(8 + pad(len(v)) for _, v in extra)
+    fout.write(b"RIFF" + struct.pack("<I", total) + b"WEBP")
+    if vp8x is not None:
+        fout.write(b"VP8X" + struct.pack("<I", len(vp8x)) + vp8x)
+    for kind, size, off in kept:
+        fin.seek(off)
+        fout.write(kind + struct.pack("<I", size))
+        _copy(fin, fout, pad(size))
+    for kind, v in extra:
+        fout.write(kind + struct.pack("<I", len(v)) + v + (b"\0" if len(v) & 1 else b""))
+
+# --- entry points ------------------------------------------------------------
+
+def rewrite(fin: BinaryIO, fout: BinaryIO, strip: bool = True, template: dict|None = None):
+    """
+    Copies an encoded JPEG/PNG/WebP from fin to fout, dropping EXIF, XMP and
+    text metadata when strip is set and writing the template fields as EXIF +
+    XMP (+ PNG text). fin must be seekable.
+    """
+    t = _template(template)
+    exif, xmp = (build_exif(t), build_xmp(t)) if t else (b"", b"")
+    magic = fin.read(12)
+    fin.seek(-len(magic), io.SEEK_CUR)
+    if magic.startswith(b"\xff\xd8"):
+        _jpeg(fin, fout, strip, exif, xmp)
+    elif magic.startswith(PNG_SIG):
+        _png(fin, fout, strip, t, exif, xmp)
+    elif magic[:4] == b"RIFF" and magic[8:12] == b"WEBP":
+        _webp(fin, fout, strip, exif, xmp)
+    else:
+        raise ValueError("unsupported format for metadata rewrite")
+
+def strip_metadata(data: bytes) -> bytes:
+    out = io.BytesIO()
+    rewrite(io.BytesIO(data), out, strip=True)
+    return out.getvalue()
+
+def inject_metadata(data: bytes, template: dict, strip: bool = False) -> bytes:
+    if not _template(template) and not strip:
+        return data
+    out = io.BytesIO()
+    rewrite(io.BytesIO(data), out, strip=strip, template=template)
+    return out.getvalue()
+
+def rewrite_file(path: Path, strip: bool = True, template: dict|None = None):
+    """In-place rewrite through a temp file in the same folder (atomic replace)."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".meta-", suffix=path.suffix)
+    try:
+        with open(path, "rb") as fin, os.fdopen(fd, "wb") as fout:
+            rewrite(fin, fout, strip=strip, template=template)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,64 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from metadata import inject_metadata
+
+@dataclass(frozen=True)
+class OutputProfile:
+    name: str
+    ext: str
+    params: tuple
+    label: str
+
+# cv2.imencode releases the GIL, so export workers encode in parallel
+PROFILES: Dict[str, OutputProfile] = {p.name: p for p in (
+    OutputProfile("png", "png", (cv2.IMWRITE_PNG_COMPRESSION, 6), "PNG, zlib level 6"),
+    OutputProfile("png-fast", "png", (cv2.IMWRITE_PNG_COMPRESSION, 1), "PNG, zlib level 1"),
+    OutputProfile("png-small", "png", (cv2.IMWRITE_PNG_COMPRESSION, 9), "PNG, zlib level 9"),
+    OutputProfile("webp-lossless", "webp", (cv2.IMWRITE_WEBP_QUALITY, 101), "WebP lossless"),
+    OutputProfile("jpeg-hq", "jpg", (cv2.IMWRITE_JPEG_QUALITY, 95,
+                                     cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444),
+                  "JPEG q95, 4:4:4"),
+)}
+
+def get_profile(name: str) -> OutputProfile:
+    return PROFILES.get(name, PROFILES["png"])
+
+def encode_image(cv_img: np.ndarray, profile: OutputProfile, template: dict|None = None) -> bytes:
+    """Encoded bytes; template fields (metadata_template) are added as EXIF/XMP/PNG text."""
+    ok, buf = cv2.imencode("." + profile.ext, cv_img, list(profile.params))
+    if not ok:
+        raise ValueError(f"Encoding failed for profile {profile.name}")
+    return inject_metadata(buf.tobytes(), template) if template else buf.tobytes()
+
+def benchmark(images: List[np.ndarray], names: List[str], repeat: int = 3) -> List[dict]:
+    """Best-of-`repeat` encode time and size per profile over `images` (BGR arrays)."""
+    raw = sum(im.nbytes for im in images)
+    rows = []
+    for name in names:
+        if name == "pillow-optimize":
+            from PIL import Image
+            import io
+            def enc(im):
+                b = io.BytesIO()
+                Image.fromarray(cv2.cvtColor(im, cv2.COLOR_BGR2RGB)).save(b, "PNG", optimize=True)
+                return b.getvalue()
+        else:
+            prof = PROFILES[name]
+            enc = lambda im: encode_image(im, prof)
+        best, size = float("inf"), 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            size = sum(len(enc(im)) for im in images)
+            best = min(best, time.perf_counter() - t0)
+        rows.append({
+            "profile": name,
+            "ms_per_image": round(1000 * best / len(images), 1),
+            "kb_per_image": round(size / 1024 / len(images), 1),
+            "ratio": round(size / raw, 3),
+        })
+    return rows
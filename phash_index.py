@@ -0,0 +1,140 @@
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def hamming_many(q: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    return _POPCOUNT[np.bitwise_xor(rows, q)].sum(axis=1, dtype=np.int32)
+
+class PhashIndex:
+    """
+    Multi-index hashing over hex phashes: two hashes within `tol` bits agree
+    exactly on at least one of tol+1 disjoint bit chunks, so candidates come
+    from chunk buckets and are verified with a vectorised popcount.
+    """
+    def __init__(self, tol: int, nbits: int = 256):
+        self.tol = tol
+        self.nbits = nbits
+        m = min(tol + 1, nbits)
+        self.bounds = [(i*nbits//m, (i+1)*nbits//m) for i in range(m)]
+        self.exhaustive = tol >= m  # pigeonhole no longer holds
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in self.bounds]
+        self.bits = np.zeros((64, nbits//8), dtype=np.uint8)
+        self.size = 0
+
+    def _chunks(self, v: int) -> Iterable[int]:
+        for a, b in self.bounds:
+            yield (v >> (self.nbits - b)) & ((1 << (b - a)) - 1)
+
+    def add(self, h_hex: str) -> int:
+        idx = self.size
+        if idx == len(self.bits):
+            self.bits = np.concatenate([self.bits, np.zeros_like(self.bits)])
+        self.bits[idx] = np.frombuffer(bytes.fromhex(h_hex), dtype=np.uint8)
+        for table, c in zip(self.tables, self._chunks(int(h_hex, 16))):
+            table.setdefault(c, []).append(idx)
+        self.size += 1
+        return idx
+
+    def query(self, h_hex: str) -> List[Tuple[int, int]]:
+        """All (id, distance) pairs within tol of h_hex."""
+        if self.exhaustive:
+            cands = np.arange(self.size)
+        else:
+            found = set()
+            for table, c in zip(self.tables, self._chunks(int(h_hex, 16))):
+                found.update(table.get(c, ()))
+            if not found:
+                return []
+            cands = np.fromiter(found, dtype=np.int64, count=len(found))
+        q = np.frombuffer(bytes.fromhex(h_hex), dtype=np.uint8)
+        d = hamming_many(q, self.bits[cands])
+        keep = d <= self.tol
+        return list(zip(cands[keep].tolist(), d[keep].tolist()))
+
+class UnionFind:
+    def __init__(self, n: int = 0):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+def duplicate_clusters(phashes: List[str], tol: int) -> List[List[int]]:
+    """Transitive near-duplicate clusters (indices into phashes), singletons included."""
+    nbits = len(phashes[0]) * 4 if phashes else 256
+    index = PhashIndex(tol, nbits)
+    uf = UnionFind(len(phashes))
+    for i, h in enumerate(phashes):
+        for j, _ in index.query(h):
+            uf.union(i, j)
+        index.add(h)
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(phashes)):
+        clusters.setdefault(uf.find(i), []).append(i)
+    return list(clusters.values())
+
+class IncrementalClusters:
+    """
+    Near-duplicate clusters that follow adds and removes. Removed entries are
+    tombstoned (the index is rebuilt once they outnumber live ones), and
+    components() walks only the clusters reachable from the given hashes.
+    """
+    def __init__(self, tol: int):
+        self.tol = tol
+        self.index = None
+        self.keys: List = []      # id -> key, None when removed
+        self.hashes: List[str] = []
+        self.ids: Dict = {}       # key -> id
+
+    def add(self, key, h_hex: str):
+        self.remove(key)
+        if self.index is None:
+            self.index = PhashIndex(self.tol, len(h_hex) * 4)
+        self.ids[key] = self.index.add(h_hex)
+        self.keys.append(key)
+        self.hashes.append(h_hex)
+
+    def remove(self, key):
+        i = self.ids.pop(key, None)
+        if i is None:
+            return
+        self.keys[i] = None
+        if len(self.keys) > 2 * len(self.ids) + 1024:
+            live = [(k, h) for k, h in zip(self.keys, self.hashes) if k is not None]
+            self.index, self.keys, self.hashes, self.ids = None, [], [], {}
+            for k, h in live:
+                self.add(k, h)
+
+    def neighbours(self, h_hex: str) -> List:
+        if self.index is None:
+            return []
+        return [self.keys[j] for j, _ in self.index.query(h_hex) if self.keys[j] is not None]
+
+    def components(self, seeds: Iterable[str]) -> List[List]:
+        """Transitive clusters (keys, singletons included) that contain a neighbour of any seed hash."""
+        seen, out = set(), []
+        for h in seeds:
+            for start in self.neighbours(h):
+                if start in seen:
+                    continue
+                seen.add(start)
+                comp, stack = [], [start]
+                while stack:
+                    k = stack.pop()
+                    comp.append(k)
+                    for n in self.neighbours(self.hashes[self.ids[k]]):
+                        if n not in seen:
+                            seen.add(n)
+                            stack.append(n)
+                out.append(comp)
+        return out
@@ -0,0 +1,56 @@
+import os, shutil
+from pathlib import Path
+from typing import Tuple
+
+# Strategies in fallback order; a setting picks where the chain starts
+PLACEMENT_MODES = ("hardlink", "reflink", "copy", "pointer")
+FICLONE = 0x40049409  # Linux ioctl: share extents (btrfs, xfs, bcachefs)
+
+def _reflink(src: Path, dst: Path) -> str:
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            import fcntl
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return "reflink"
+        except (ImportError, OSError):
+            pass
+        if not hasattr(os, "copy_file_range"):
+            raise OSError("copy_file_range unavailable")
+        # In-kernel copy; NFS 4.2/SMB servers and CoW filesystems copy server side
+        left = os.fstat(s.fileno()).st_size
+        while left > 0:
+            n = os.copy_file_range(s.fileno(), d.fileno(), left)
+            if n == 0:
+                raise OSError("copy_file_range stopped early")
+            left -= n
+        return "copy_file_range"
+
+def _pointer(src: Path, dst: Path) -> Path:
+    ptr = dst.with_name(dst.name + ".source.txt")
+    ptr.write_text(str(Path(src).resolve()) + "\n", encoding="utf-8")
+    return ptr
+
+def place_file(src: Path, dst: Path, mode: str = "hardlink") -> Tuple[Path, str]:
+    """
+    Puts src at dst without reading it into memory, trying the strategies
+    from `mode` onwards: hardlink, reflink/copy_file_range, streamed copy,
+    then a pointer file (<name>.source.txt holding the source path).
+    Returns (written path, strategy used).
+    """
+    src, dst = Path(src), Path(dst)
+    start = PLACEMENT_MODES.index(mode) if mode in PLACEMENT_MODES else 0
+    for strategy in PLACEMENT_MODES[start:]:
+        if strategy == "pointer":
+            return _pointer(src, dst), "pointer"
+        try:
+            dst.unlink(missing_ok=True)
+            if strategy == "hardlink":
+                os.link(src, dst)
+                return dst, "hardlink"
+            if strategy == "reflink":
+                return dst, _reflink(src, dst)
+            shutil.copyfile(src, dst)
+            return dst, "copy"
+        except OSError:
+            dst.unlink(missing_ok=True)
+    return _pointer(src, dst), "pointer"
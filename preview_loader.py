@@ -0,0 +1,116 @@
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from PIL import Image
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QImage
+
+from image_cache import shared_image_cache
+from image_processing import load_image_reduced, pil_to_cv
+from subject_detection import subject_detector
+
+def _key(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return path, st.st_size, st.st_mtime_ns
+
+def decode_preview(path: str, side: int) -> Tuple[QImage, object]:
+    """Reduced-scale decode fitted to side x side, plus its subject Detection in preview pixels."""
+    im = shared_image_cache().get(Path(path))
+    if im is None:
+        im, _ = load_image_reduced(Path(path), side)
+    if max(im.size) > side:
+        im = im.copy()
+        im.thumbnail((side, side), Image.Resampling.LANCZOS)
+    if im.mode != "RGB":
+        im = im.convert("RGB")
+    qimg = QImage(im.tobytes(), im.width, im.height, im.width * 3, QImage.Format.Format_RGB888).copy()
+    try:
+        det = subject_detector().detect(pil_to_cv(im))
+    except Exception as e:
+        print(f"Subject detection failed for {Path(path).name}: {e}")
+        det = None
+    return qimg, det
+
+class PreviewSignals(QObject):
+    loaded = Signal(object, object, object)  # key, QImage|None, Detection|None
+
+class PreviewRunnable(QRunnable):
+    def __init__(self, key, side: int, signals: PreviewSignals):
+        super().__init__()
+        self.key = key
+        self.side = side
+        self.signals = signals
+        self.started = False
+        self.setAutoDelete(False)  # the loader keeps it until its result arrives
+
+    def run(self):
+        self.started = True
+        try:
+            qimg, det = decode_preview(self.key[0], self.side)
+        except Exception as e:
+            print(f"Preview failed for {Path(self.key[0]).name}: {e}")
+            qimg, det = None, None
+        try:
+            self.signals.loaded.emit(self.key, qimg, det)
+        except RuntimeError:
+            pass  # loader was destroyed (window closed) while decoding
+
+class PreviewLoader(QObject):
+    """
+    Decodes review-panel previews off the GUI thread at reduced scale,
+    keeps the last `cache_items` in an LRU and prefetches neighbours of the
+    selection. A new request drops every queued decode that has not started,
+    so fast arrow-keying only decodes what is still wanted.
+    """
+    ready = Signal(str, QImage, object)  # path, preview, Detection|None
+
+    def __init__(self, side: int = 720, cache_items: int = 32, threads: int = 2, parent=None):
+        super().__init__(parent)
+        self.side = side
+        self.cache_items = cache_items
+        self.cache: "OrderedDict[tuple, Tuple[QImage, object]]" = OrderedDict()
+        self.inflight = {}
+        self.current: Optional[str] = None
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, threads))
+        self.signals = PreviewSignals()
+        self.signals.loaded.connect(self.on_loaded)
+
+    def request(self, path: str, neighbours: List[str] = ()) -> Optional[Tuple[QImage, object]]:
+        """Cached (preview, detection) for path, or None and `ready` fires when decoded."""
+        self.current = path
+        self.pool.clear()
+        # Only decodes already running survive the clear
+        self.inflight = {k: r for k, r in self.inflight.items() if r.started}
+        hit = None
+        for i, p in enumerate([path, *neighbours]):
+            try:
+                key = _key(p)
+            except OSError:
+                continue
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                if i == 0:
+                    hit = self.cache[key]
+                continue
+            if key not in self.inflight:
+                r = self.inflight[key] = PreviewRunnable(key, self.side, self.signals)
+                self.pool.start(r, -i)
+        return hit
+
+    def on_loaded(self, key, qimg, det):
+        self.inflight.pop(key, None)
+        if qimg is None:
+            return
+        self.cache[key] = (qimg, det)
+        while len(self.cache) > self.cache_items:
+            self.cache.popitem(last=False)
+        if key[0] == self.current:
+            self.ready.emit(key[0], qimg, det)
+
+    def clear(self):
+        self.pool.clear()
+        self.inflight = {k: r for k, r in self.inflight.items() if r.started}
+        self.cache.clear()
@@ -0,0 +1,59 @@
+import csv, json, queue, threading, time
+from pathlib import Path
+from typing import List
+
+class ReportWriter:
+    """
+    Streams manifest.csv rows and report.jsonl records from one writer
+    thread. Export workers only enqueue; lines are flushed every `batch`
+    records or `interval` seconds, so memory stays flat however many images
+    are exported.
+    """
+    def __init__(self, out_dir: Path, manifest_fields: List[str], batch: int = 256, interval: float = 1.0):
+        self.out_dir = Path(out_dir)
+        self.batch = max(1, batch)
+        self.interval = interval
+        self.rows = 0
+        self.q: "queue.Queue" = queue.Queue()
+        self.manifest_f = open(self.out_dir / "manifest.csv", "w", newline="", encoding="utf-8")
+        self.manifest = csv.DictWriter(self.manifest_f, fieldnames=manifest_fields)
+        self.manifest.writeheader()
+        self.report_f = open(self.out_dir / "report.jsonl", "w", encoding="utf-8")
+        self.thread = threading.Thread(target=self._run, name="report-writer", daemon=True)
+        self.thread.start()
+
+    def add_row(self, row: dict):
+        self.q.put(("row", row))
+
+    def add_report(self, record: dict):
+        self.q.put(("report", record))
+
+    def _run(self):
+        unflushed = 0
+        last = time.monotonic()
+        while True:
+            try:
+                item = self.q.get(timeout=self.interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                kind, data = item
+                if kind == "row":
+                    self.manifest.writerow(data)
+                    self.rows += 1
+                else:
+                    self.report_f.write(json.dumps(data) + "\n")
+                unflushed += 1
+            if unflushed and (unflushed >= self.batch or time.monotonic() - last >= self.interval):
+                self.manifest_f.flush()
+                self.report_f.flush()
+                unflushed, last = 0, time.monotonic()
+        self.manifest_f.close()
+        self.report_f.close()
+
+    def close(self):
+        """Writes everything still queued and closes both files."""
+        self.q.put(None)
+        self.thread.join()
@@ -0,0 +1,142 @@
+import os, json, sqlite3, threading, hashlib
+from pathlib import Path
+from typing import Iterable, Optional, Set, Tuple
+
+from thumb_store import ThumbRef, thumb_store, thumb_key
+
+SCHEMA_VERSION = 3
+COMMIT_EVERY = 256
+
+def default_cache_path() -> Path:
+    return Path.home() / ".jewels_scan_cache.sqlite"
+
+def file_signature(p: Path) -> Tuple[int, int]:
+    st = os.stat(p)
+    return st.st_size, st.st_mtime_ns
+
+def file_sha256(p: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ScanCache:
+    """
+    Persistent per-file scan results keyed by path + size + mtime, per analysis
+    variant ("full" or a fast-scan resolution).
+    With verify_hash, a signature mismatch falls back to comparing the content
+    hash so touched-but-identical files still hit.
+    Thumbnails go to a packed ThumbStore next to the database (.thumbs) and
+    hits return a ThumbRef, so no thumbnail pixels are read until painted.
+    Slots of forgotten entries go to a free list and are handed out again
+    before the thumbnail file grows.
+    """
+    def __init__(self, path: Path, verify_hash: bool = False):
+        self.path = Path(path)
+        self.verify_hash = verify_hash
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.thumbs = thumb_store(self.path.with_suffix(".thumbs"))
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS scans")
+            self.conn.execute("DROP TABLE IF EXISTS free_slots")
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scans ("
+            " path TEXT, variant TEXT, size INTEGER, mtime_ns INTEGER, sha256 TEXT,"
+            " width INTEGER, height INTEGER, phash TEXT, metrics TEXT, analysis_scale REAL,"
+            " thumb_slot INTEGER, thumb_w INTEGER, thumb_h INTEGER, PRIMARY KEY (path, variant))"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY)")
+        self.conn.commit()
+
+    def get(self, p: Path, variant: str = "full") -> Optional[dict]:
+        size, mtime_ns = file_signature(p)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, sha256, width, height, phash, metrics, analysis_scale, thumb_slot, thumb_w, thumb_h"
+                " FROM scans WHERE path=? AND variant=?", (str(p), variant)).fetchone()
+        # the slot must still carry this entry's key (another process may have written it)
+        if row is None or row[8] is None or not self.thumbs.holds(row[8], thumb_key(str(p), variant)):
+            return None
+        if (row[0], row[1]) != (size, mtime_ns):
+            if not (self.verify_hash and row[2] and row[2] == file_sha256(p)):
+                return None
+            with self.lock:
+                self.conn.execute("UPDATE scans SET size=?, mtime_ns=? WHERE path=? AND variant=?",
+                                  (size, mtime_ns, str(p), variant))
+                self._maybe_commit()
+        return {
+            "width": row[3], "height": row[4], "phash": row[5],
+            "metrics": json.loads(row[6]), "analysis_scale": row[7], "signature": (size, mtime_ns),
+            "thumb_ref": ThumbRef(str(self.thumbs.path), row[8], thumb_key(str(p), variant)),
+            "thumb_size": (row[9], row[10])
+        }
+
+    def put(self, p: Path, record: dict, variant: str = "full") -> ThumbRef:
+        """Stores the record; its thumbnail reuses the slot of the entry it replaces."""
+        size, mtime_ns = record.get("signature") or file_signature(p)
+        sha = file_sha256(p) if self.verify_hash else None
+        tw, th = record["thumb_size"]
+        key = thumb_key(str(p), variant)
+        with self.lock:
+            row = self.conn.execute("SELECT thumb_slot FROM scans WHERE path=? AND variant=?",
+                                    (str(p), variant)).fetchone()
+        slot = row[0] if row and row[0] is not None else self._allocate()
+        self.thumbs.write(slot, key, record["thumb"], tw, th)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO scans VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (str(p), variant, size, mtime_ns, sha, record["width"], record["height"], record["phash"],
+                 json.dumps(record["metrics"]), record.get("analysis_scale", 1.0), slot, tw, th))
+            self._maybe_commit()
+        return ThumbRef(str(self.thumbs.path), slot, key)
+
+    def _allocate(self) -> int:
+        """A free slot if one is left, else a new one at the end of the thumbnail file."""
+        with self.lock:
+            row = self.conn.execute("SELECT slot FROM free_slots ORDER BY slot LIMIT 1").fetchone()
+            # the delete runs under SQLite's write lock, so only one process can claim the slot
+            if row is not None and self.conn.execute("DELETE FROM free_slots WHERE slot=?", row).rowcount == 1:
+                self._maybe_commit()
+                return row[0]
+        return self.thumbs.allocate()
+
+    def forget(self, paths: Iterable[str]):
+        """Drops the entries (every variant) of these paths and frees their thumbnail slots."""
+        with self.lock:
+            for path in paths:
+                slots = self.conn.execute("SELECT thumb_slot FROM scans WHERE path=? AND thumb_slot IS NOT NULL",
+                                          (path,)).fetchall()
+                self.conn.executemany("INSERT OR IGNORE INTO free_slots VALUES (?)", slots)
+                self.conn.execute("DELETE FROM scans WHERE path=?", (path,))
+            self.conn.commit()
+            self.pending = 0
+
+    def prune(self, folder: Path, keep: Set[str]):
+        """Forgets entries under folder whose path is not in `keep` (files deleted or moved since)."""
+        prefix = os.path.join(str(folder), "")
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT path FROM scans WHERE path >= ? AND path < ?",
+                                     (prefix, upper)).fetchall()
+        self.forget([r[0] for r in rows if r[0] not in keep])
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,159 @@
+import heapq, itertools, os, threading
+from pathlib import Path
+from typing import Iterable, List
+
+from PIL import Image
+from PySide6.QtCore import QRunnable, QThreadPool
+
+def physical_memory_mb() -> int:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return 8192
+
+def header_dims(path: Path) -> tuple[int, int, int]:
+    """(width, height, bands) from the file header; nothing is decoded."""
+    with Image.open(path) as im:
+        return im.width, im.height, len(im.getbands())
+
+def estimate_bytes(w: int, h: int, bands: int = 3, copies: float = 4.0) -> int:
+    """Peak working set of one item: decoded pixels times the copies the pipeline holds at once."""
+    return int(w * h * max(3, bands) * copies)
+
+# Lower runs first; FIFO within a priority
+PRIORITY_VISIBLE = 0   # shown in the gallery viewport
+PRIORITY_SELECTED = 1  # matches the active selection filter
+PRIORITY_NORMAL = 2
+
+class Cancelled(Exception):
+    pass
+
+class CancelToken:
+    """Cooperative cancellation shared by one manager's runnables; they check it between stages."""
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled()
+
+class _Admitted(QRunnable):
+    def __init__(self, inner: QRunnable, cost: int, scheduler: "WorkScheduler"):
+        super().__init__()
+        self.inner = inner
+        self.cost = cost
+        self.scheduler = scheduler
+
+    def run(self):
+        try:
+            self.inner.run()
+        finally:
+            self.scheduler._release(self.cost)
+
+class WorkScheduler:
+    """
+    Feeds a QThreadPool from a priority queue (FIFO within a priority),
+    admitting an item only while the in-flight count is under
+    `max_inflight` and the estimated bytes of everything in flight stay
+    within `budget_mb`. An item larger than the whole budget runs alone
+    rather than never. Submission never blocks; queued items submitted with
+    a key can be reprioritized, and clear() hands back everything not started.
+    """
+    def __init__(self, pool: QThreadPool|None = None, max_inflight: int = 0, budget_mb: int = 0):
+        self.pool = pool or QThreadPool.globalInstance()
+        self.max_inflight = max_inflight or 2 * max(1, self.pool.maxThreadCount())
+        self.budget = (budget_mb or physical_memory_mb() // 2) * 1024 * 1024
+        self.lock = threading.Lock()
+        # heap of [priority, order, tiebreak, key, runnable, cost]; runnable None = superseded
+        self.queue: list = []
+        self.queued: dict = {}  # key -> live heap entry
+        self.seq = itertools.count()
+        self.inflight = 0
+        self.inflight_bytes = 0
+        self.peak_inflight = 0
+        self.peak_bytes = 0
+        self.admitted = 0
+        self.deferred = 0  # submissions that had to wait in the queue
+
+    def submit(self, runnable: QRunnable, cost: int = 0, priority: int = PRIORITY_NORMAL, key=None):
+        with self.lock:
+            if not self.queued and self._fits(cost):
+                self._admit(runnable, cost)
+                return
+            self._push(priority, key, runnable, cost)
+            self.deferred += 1
+            self._drain()
+
+    def _push(self, priority: int, key, runnable: QRunnable, cost: int, order: int|None = None):
+        tiebreak = next(self.seq)  # unique, so a superseded entry never compares past it
+        entry = [priority, tiebreak if order is None else order, tiebreak, key, runnable, cost]
+        heapq.heappush(self.queue, entry)
+        self.queued[key if key is not None else id(entry)] = entry
+
+    def _drain(self):
+        while self.queue:
+            _, _, _, key, runnable, cost = self.queue[0]
+            if runnable is None:
+                heapq.heappop(self.queue)
+                continue
+            if not self._fits(cost):
+                return
+            entry = heapq.heappop(self.queue)
+            k = key if key is not None else id(entry)
+            if self.queued.get(k) is entry:
+                del self.queued[k]
+            self._admit(runnable, cost)
+
+    def reprioritize(self, keys: Iterable, priority: int):
+        """Moves queued items with these keys to `priority`, keeping their submission order within it."""
+        with self.lock:
+            for key in keys:
+                entry = self.queued.get(key)
+                if entry is None or entry[0] == priority:
+                    continue
+                self._push(priority, key, entry[4], entry[5], entry[1])
+                entry[4] = None
+            self._drain()
+
+    def clear(self) -> List[QRunnable]:
+        """Drops every queued item and returns them (in queue order) so callers can report them."""
+        with self.lock:
+            dropped = [e[4] for e in sorted(self.queue) if e[4] is not None]
+            self.queue, self.queued = [], {}
+            return dropped
+
+    def _fits(self, cost: int) -> bool:
+        if self.inflight == 0:
+            return True
+        return self.inflight < self.max_inflight and self.inflight_bytes + cost <= self.budget
+
+    def _admit(self, runnable: QRunnable, cost: int):
+        self.inflight += 1
+        self.inflight_bytes += cost
+        self.admitted += 1
+        self.peak_inflight = max(self.peak_inflight, self.inflight)
+        self.peak_bytes = max(self.peak_bytes, self.inflight_bytes)
+        self.pool.start(_Admitted(runnable, cost, self))
+
+    def _release(self, cost: int):
+        with self.lock:
+            self.inflight -= 1
+            self.inflight_bytes -= cost
+            self._drain()
+
+    def stats(self) -> dict:
+        with self.lock:
+            mb = 1024 * 1024
+            return {
+                "queued": len(self.queued), "inflight": self.inflight,
+                "inflight_mb": round(self.inflight_bytes / mb, 1), "budget_mb": round(self.budget / mb),
+                "max_inflight": self.max_inflight, "peak_inflight": self.peak_inflight,
+                "peak_mb": round(self.peak_bytes / mb, 1), "admitted": self.admitted, "deferred": self.deferred,
+            }
@@ -1,6 +1,9 @@
 
-from PySide6.QtWidgets import QDialog, QFormLayout, QDialogButtonBox, QLineEdit, QDoubleSpinBox, QCheckBox
+from PySide6.QtWidgets import QDialog, QFormLayout, QDialogButtonBox, QLineEdit, QDoubleSpinBox, QCheckBox, QSpinBox, QPushButton, QMessageBox, QComboBox
 from utils import AppSettings
+from caption_cache import configure_caption_cache
+from placement import PLACEMENT_MODES
+from output_profiles import PROFILES
 
 class SettingsDialog(QDialog):
     def __init__(self, settings: AppSettings, parent=None):
@@ -15,6 +18,13 @@ class SettingsDialog(QDialog):
         self.exclude = QLineEdit(self.s.data["exclude_globs"])
         self.max_up = QDoubleSpinBox(); self.max_up.setRange(1.0,8.0); self.max_up.setSingleStep(0.1); self.max_up.setValue(self.s.data["max_upscale_factor"])
         self.deblock = QCheckBox(); self.deblock.setChecked(self.s.data["enable_deblock"])
+        self.text_reports = QCheckBox(); self.text_reports.setChecked(self.s.data.get("text_reports", False))
+        self.watch_export = QCheckBox(); self.watch_export.setChecked(self.s.data.get("watch_export", False))
+        self.placement = QComboBox(); self.placement.addItems(PLACEMENT_MODES); self.placement.setCurrentText(self.s.data.get("placement", "hardlink"))
+        self.profile = QComboBox()
+        for p in PROFILES.values():
+            self.profile.addItem(p.label, p.name)
+        self.profile.setCurrentIndex(max(0, self.profile.findData(self.s.data.get("output_profile", "png"))))
         self.enable_crop = QCheckBox(); self.enable_crop.setChecked(self.s.data["enable_intelligent_crop"])
         self.artist = QLineEdit(self.s.data["metadata_template"].get("Artist",""))
         self.copyright = QLineEdit(self.s.data["metadata_template"].get("Copyright",""))
@@ -25,7 +35,15 @@ class SettingsDialog(QDialog):
         self.lm_model = QLineEdit(self.s.data["lmstudio"]["model"])
         self.lm_prefix = QLineEdit(self.s.data["lmstudio"]["prefix"])
         self.lm_pattern = QLineEdit(self.s.data["lmstudio"]["rename_pattern"])
+        self.lm_combined = QCheckBox(); self.lm_combined.setChecked(self.s.data["lmstudio"].get("combined_request", False))
+        self.lm_inflight = QSpinBox(); self.lm_inflight.setRange(1,64); self.lm_inflight.setValue(self.s.data["lmstudio"].get("max_in_flight", 2))
+        self.lm_retries = QSpinBox(); self.lm_retries.setRange(0,10); self.lm_retries.setValue(self.s.data["lmstudio"].get("retries", 3))
+        self.lm_cap_conc = QSpinBox(); self.lm_cap_conc.setRange(1,64); self.lm_cap_conc.setValue(self.s.data["lmstudio"].get("caption_concurrency", 4))
+        self.lm_defer = QCheckBox(); self.lm_defer.setChecked(self.s.data["lmstudio"].get("defer_captions", False))
         self.vlm_prompt = QLineEdit(self.s.data["vlm_cropper_prompt"])
+        self.lm_cache = QCheckBox(); self.lm_cache.setChecked(self.s.data["lmstudio"].get("cache_captions", True))
+        clear_cache_btn = QPushButton("Clear cached captions for this model")
+        clear_cache_btn.clicked.connect(self.clear_caption_cache)
 
         lay.addRow("Pass threshold ≥", self.pass_thr)
         lay.addRow("Select min score ≥", self.sel_thr)
@@ -34,6 +52,10 @@ class SettingsDialog(QDialog):
         lay.addRow("Max upscale factor", self.max_up)
         lay.addRow("Enable JPEG deblock", self.deblock)
         lay.addRow("Enable intelligent crop", self.enable_crop)
+        lay.addRow("Per-image text reports", self.text_reports)
+        lay.addRow("Watch: re-export changes to last export folder", self.watch_export)
+        lay.addRow("Place duplicates/maybe/fail by", self.placement)
+        lay.addRow("Output encoding", self.profile)
         lay.addRow("EXIF Artist", self.artist)
         lay.addRow("EXIF Copyright", self.copyright)
         lay.addRow("EXIF ImageDescription", self.desc)
@@ -43,6 +65,13 @@ class SettingsDialog(QDialog):
         lay.addRow("LM Studio model", self.lm_model)
         lay.addRow("Filename prefix", self.lm_prefix)
         lay.addRow("Rename pattern", self.lm_pattern)
+        lay.addRow("One request for name + caption + tags", self.lm_combined)
+        lay.addRow("LM Studio max concurrent requests", self.lm_inflight)
+        lay.addRow("LM Studio retries", self.lm_retries)
+        lay.addRow("Concurrent caption jobs", self.lm_cap_conc)
+        lay.addRow("Defer captions (run `caption` later)", self.lm_defer)
+        lay.addRow("Cache captions", self.lm_cache)
+        lay.addRow("", clear_cache_btn)
         lay.addRow("VLM Crop Prompt", self.vlm_prompt)
 
         btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=self)
@@ -50,6 +79,14 @@ class SettingsDialog(QDialog):
         btns.rejected.connect(self.reject)
         lay.addRow(btns)
 
+    def clear_caption_cache(self):
+        cache = configure_caption_cache(dict(self.s.data["lmstudio"], cache_captions=True))
+        if cache is None:
+            return
+        model = self.lm_model.text().strip()
+        removed = cache.invalidate(model=model) if model else 0
+        QMessageBox.information(self, "Caption cache", f"Removed {removed} cached replies for '{model}'.")
+
     def accept(self):
         self.s.data["pass_threshold"] = float(self.pass_thr.value())
         self.s.data["select_min_score"] = float(self.sel_thr.value())
@@ -58,6 +95,10 @@ class SettingsDialog(QDialog):
         self.s.data["max_upscale_factor"] = float(self.max_up.value())
         self.s.data["enable_deblock"] = self.deblock.isChecked()
         self.s.data["enable_intelligent_crop"] = self.enable_crop.isChecked()
+        self.s.data["text_reports"] = self.text_reports.isChecked()
+        self.s.data["watch_export"] = self.watch_export.isChecked()
+        self.s.data["placement"] = self.placement.currentText()
+        self.s.data["output_profile"] = self.profile.currentData()
         self.s.data["metadata_template"] = {
             "Artist": self.artist.text(),
             "Copyright": self.copyright.text(),
@@ -69,6 +110,12 @@ class SettingsDialog(QDialog):
         self.s.data["lmstudio"]["model"] = self.lm_model.text().strip()
         self.s.data["lmstudio"]["prefix"] = self.lm_prefix.text().strip()
         self.s.data["lmstudio"]["rename_pattern"] = self.lm_pattern.text().strip()
+        self.s.data["lmstudio"]["combined_request"] = self.lm_combined.isChecked()
+        self.s.data["lmstudio"]["max_in_flight"] = self.lm_inflight.value()
+        self.s.data["lmstudio"]["cache_captions"] = self.lm_cache.isChecked()
+        self.s.data["lmstudio"]["retries"] = self.lm_retries.value()
+        self.s.data["lmstudio"]["caption_concurrency"] = self.lm_cap_conc.value()
+        self.s.data["lmstudio"]["defer_captions"] = self.lm_defer.isChecked()
         self.s.data["vlm_cropper_prompt"] = self.vlm_prompt.text().strip()
         self.s.save()
         super().accept()
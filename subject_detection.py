@@ -0,0 +1,147 @@
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type
+
+import cv2
+import numpy as np
+
+_tls = threading.local()
+
+def _thread_cached(key: str, factory):
+    """One instance per worker thread; OpenCV detectors are not thread-safe to share."""
+    obj = getattr(_tls, key, None)
+    if obj is None:
+        obj = factory()
+        setattr(_tls, key, obj)
+    return obj
+
+def face_cascade_path() -> str:
+    return str(Path(cv2.data.haarcascades) / "haarcascade_frontalface_default.xml")
+
+@dataclass
+class Detection:
+    bbox: Tuple[int, int, int, int]     # x, y, w, h
+    score: float                        # 0..1, comparable within one detector
+    detector: str
+    center: Optional[Tuple[int, int]] = None
+    pad: Optional[float] = None         # crop side = max(w, h) * pad; None = largest square
+
+    def scaled(self, fx: float, fy: float) -> "Detection":
+        x, y, w, h = self.bbox
+        c = self.center
+        return Detection(
+            (int(round(x*fx)), int(round(y*fy)), int(round(w*fx)), int(round(h*fy))),
+            self.score, self.detector,
+            (int(round(c[0]*fx)), int(round(c[1]*fy))) if c else None, self.pad)
+
+    def crop_square(self, w: int, h: int) -> Tuple[int, int, int]:
+        """(x, y, side) of the square crop centred on the subject inside a w x h image."""
+        bx, by, bw, bh = self.bbox
+        cx, cy = self.center or (bx + bw//2, by + bh//2)
+        side = min(h, w) if self.pad is None else min(int(max(bw, bh) * self.pad), min(h, w))
+        x = max(0, min(w - side, cx - side//2))
+        y = max(0, min(h - side, cy - side//2))
+        return x, y, side
+
+class Detector:
+    """Finds a subject in a BGR proxy image; returns None when it has no opinion."""
+    name = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def detect(self, proxy: np.ndarray, scale: float) -> Optional[Detection]:
+        raise NotImplementedError
+
+class HaarFaceDetector(Detector):
+    name = "haar_face"
+    min_face = 64  # in source pixels
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, "CascadeClassifier")
+
+    def detect(self, proxy, scale):
+        cascade = _thread_cached("haar_face", lambda: cv2.CascadeClassifier(face_cascade_path()))
+        gray = cv2.cvtColor(proxy, cv2.COLOR_BGR2GRAY)
+        m = max(24, int(round(self.min_face * scale)))
+        faces, hits = cascade.detectMultiScale2(gray, 1.2, 5, minSize=(m, m))
+        if len(faces) == 0:
+            return None
+        i = max(range(len(faces)), key=lambda k: faces[k][2]*faces[k][3])
+        x, y, w, h = (int(v) for v in faces[i])
+        n = int(hits[i])
+        return Detection((x, y, w, h), n / (n + 5.0), self.name, pad=2.0)
+
+class SaliencyDetector(Detector):
+    name = "saliency"
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, "saliency")  # opencv-contrib
+
+    def detect(self, proxy, scale):
+        sal = _thread_cached("saliency", cv2.saliency.StaticSaliencySpectralResidual_create)
+        ok, salmap = sal.computeSaliency(proxy)
+        if not ok:
+            return None
+        salmap = (salmap*255).astype("uint8")
+        m = cv2.moments(salmap)
+        if m["m00"] == 0:
+            return None
+        cx, cy = int(m["m10"]/m["m00"]), int(m["m01"]/m["m00"])
+        mask = salmap >= max(1, int(salmap.max()) // 2)
+        ys, xs = np.nonzero(mask)
+        x, y = int(xs.min()), int(ys.min())
+        w, h = int(xs.max()) - x + 1, int(ys.max()) - y + 1
+        # share of total saliency inside the box
+        score = float(salmap[y:y+h, x:x+w].sum(dtype=np.float64) / max(1.0, salmap.sum(dtype=np.float64)))
+        return Detection((x, y, w, h), score, self.name, center=(cx, cy))
+
+DETECTORS: Dict[str, Type[Detector]] = {
+    HaarFaceDetector.name: HaarFaceDetector,
+    SaliencyDetector.name: SaliencyDetector,
+}
+
+def register_detector(cls: Type[Detector]):
+    DETECTORS[cls.name] = cls
+    return cls
+
+class SubjectDetector:
+    """
+    Runs detectors in priority order on a proxy whose long side is at most
+    proxy_side and maps the first hit back to the input (or out_size)
+    coordinates. Falls back to a centred box with score 0.
+    """
+    def __init__(self, detectors: List[str] = ("haar_face", "saliency"), proxy_side: int = 512):
+        self.detectors = [DETECTORS[n]() for n in detectors if n in DETECTORS and DETECTORS[n].available()]
+        self.proxy_side = proxy_side
+
+    def detect(self, cv_img: np.ndarray, out_size: Tuple[int, int]|None = None) -> Detection:
+        h, w = cv_img.shape[:2]
+        ow, oh = out_size or (w, h)
+        scale = min(1.0, self.proxy_side / max(h, w)) if self.proxy_side else 1.0
+        proxy = cv_img if scale >= 1.0 else cv2.resize(
+            cv_img, (max(1, round(w*scale)), max(1, round(h*scale))), interpolation=cv2.INTER_AREA)
+        ph, pw = proxy.shape[:2]
+        for d in self.detectors:
+            try:
+                det = d.detect(proxy, scale)
+            except cv2.error:
+                det = None
+            if det is not None:
+                return det.scaled(ow / pw, oh / ph)
+        side = min(ow, oh)
+        return Detection(((ow - side)//2, (oh - side)//2, side, side), 0.0, "center")
+
+_default = SubjectDetector()
+
+def subject_detector() -> SubjectDetector:
+    return _default
+
+def configure_subject_detector(detectors: str = "haar_face,saliency", proxy_side: int = 512) -> SubjectDetector:
+    global _default
+    _default = SubjectDetector([n.strip() for n in detectors.split(",") if n.strip()], proxy_side)
+    return _default
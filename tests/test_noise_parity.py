@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from image_processing import estimate_noise_std, estimate_noise_std_reference
+
+def _flat_with_noise(rng, h, w, sigma, ramp=0.0):
+    base = np.full((h, w), rng.integers(0, 256), np.float64)
+    g = base + rng.normal(0, sigma, (h, w)) + np.linspace(0, ramp, w)[None, :]
+    return np.clip(g, 0, 255).astype(np.uint8)
+
+def _corpus(seed):
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(24):
+        h, w = (int(v) for v in rng.integers(20, 300, 2))
+        # Laplacian variance is ~20*sigma^2, so sigma < 0.5 keeps patches flat
+        g = _flat_with_noise(rng, h, w, rng.uniform(0, 1), rng.uniform(0, 40))
+        if i % 3 == 0:
+            g[::7] = 255  # hard edges, so some patches fail the flatness test
+        out.append(g)
+    out.append(rng.integers(0, 256, (160, 200)).astype(np.uint8))  # no flat patch at all
+    return out
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_reference_loop(seed):
+    for g in _corpus(seed):
+        assert estimate_noise_std(g) == pytest.approx(estimate_noise_std_reference(g), abs=1e-9), g.shape
+
+@pytest.mark.parametrize("shape", [(16, 16), (31, 400), (32, 32), (33, 47), (48, 32)])
+def test_edge_sizes(shape):
+    rng = np.random.default_rng(sum(shape))
+    g = _flat_with_noise(rng, *shape, sigma=0.4)
+    assert estimate_noise_std(g) == pytest.approx(estimate_noise_std_reference(g), abs=1e-9)
+
+def test_band_split_does_not_change_result():
+    # noise grows down the image, so the flattest patch sits in one band only
+    rng = np.random.default_rng(7)
+    sigma = np.linspace(3.0, 0.1, 700)[:, None]
+    g = np.clip(120 + rng.normal(0, 1, (700, 300)) * sigma, 0, 255).astype(np.uint8)
+    expected = estimate_noise_std_reference(g)
+    for band_rows in (1, 3, 32, 1000):
+        assert estimate_noise_std(g, band_rows=band_rows) == pytest.approx(expected, abs=1e-9)
@@ -0,0 +1,140 @@
+import hashlib, mmap, os, struct, threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b"JTHUMB01"
+PAGE = 4096
+SLOT_HEADER = struct.Struct("<16sHH")  # key digest, width, height
+
+@contextmanager
+def _file_lock(f):
+    """Exclusive lock on the whole file across processes (flock, or a 1-byte msvcrt lock)."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def thumb_key(path: str, variant: str) -> bytes:
+    return hashlib.blake2b(f"{path}\0{variant}".encode("utf-8"), digest_size=16).digest()
+
+class ThumbStore:
+    """
+    One packed file of fixed-size, page-aligned slots holding RGB888
+    thumbnails of at most `side` px. Slot numbers are recorded by the scan
+    cache; reads go through a read-only mmap so only thumbnails that are
+    painted are paged in. Each slot starts with the digest of its key, so a
+    slot that was reused or lost reads as a miss instead of a wrong image.
+    The file may be shared by several processes: its length is the slot
+    counter, and it only grows under an exclusive file lock.
+    """
+    def __init__(self, path: Path, side: int = 180):
+        self.path = Path(path)
+        self.side = side
+        self.slot_bytes = -(-(SLOT_HEADER.size + side*side*3) // PAGE) * PAGE
+        self.lock = threading.Lock()
+        self.mm: Optional[mmap.mmap] = None
+        header = MAGIC + struct.pack("<I", side)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+        self.f = os.fdopen(fd, "r+b", buffering=0)
+        with _file_lock(self.f):
+            self.f.seek(0)
+            if self.f.read(len(header)) != header:
+                self.f.truncate(0)
+                self.f.seek(0)
+                self.f.write(header.ljust(PAGE, b"\0"))
+
+    def _offset(self, slot: int) -> int:
+        return PAGE + slot * self.slot_bytes
+
+    def allocate(self) -> int:
+        """Claims a new slot at the end of the file, never one another process already got."""
+        with self.lock, _file_lock(self.f):
+            size = os.fstat(self.f.fileno()).st_size
+            slot = max(0, -(-(size - PAGE) // self.slot_bytes))
+            self.f.truncate(self._offset(slot + 1))
+            return slot
+
+    def write(self, slot: int, key: bytes, data: bytes, w: int, h: int):
+        if w > self.side or h > self.side or len(data) != w*h*3:
+            raise ValueError(f"Thumbnail {w}x{h} does not fit a {self.side}px slot")
+        with self.lock:
+            self.f.seek(self._offset(slot))
+            self.f.write(SLOT_HEADER.pack(key, w, h) + data)
+
+    def _map(self, off: int) -> bool:
+        """Maps the file far enough to read the header at `off` (call with the lock held)."""
+        if self.mm is None or off + SLOT_HEADER.size > len(self.mm):
+            size = os.fstat(self.f.fileno()).st_size
+            if off + SLOT_HEADER.size > size:
+                return False
+            if self.mm is not None:
+                self.mm.close()
+            self.mm = mmap.mmap(self.f.fileno(), size, access=mmap.ACCESS_READ)
+        return True
+
+    def holds(self, slot: int, key: bytes) -> bool:
+        """Whether the slot still carries `key`; only its header is read."""
+        off = self._offset(slot)
+        with self.lock:
+            return self._map(off) and SLOT_HEADER.unpack_from(self.mm, off)[0] == key
+
+    def read(self, slot: int, key: bytes) -> Optional[Tuple[bytes, int, int]]:
+        """(rgb bytes, w, h), or None if the slot does not hold `key`."""
+        off = self._offset(slot)
+        with self.lock:
+            if not self._map(off):
+                return None
+            got, w, h = SLOT_HEADER.unpack_from(self.mm, off)
+            start = off + SLOT_HEADER.size
+            if got != key or start + w*h*3 > len(self.mm):
+                return None
+            return self.mm[start:start + w*h*3], w, h
+
+    def close(self):
+        with self.lock:
+            if self.mm is not None:
+                self.mm.close()
+                self.mm = None
+            self.f.close()
+
+@dataclass(frozen=True)
+class ThumbRef:
+    """Where a scan item's thumbnail lives; resolved only when it is painted."""
+    store: str
+    slot: int
+    key: bytes
+
+    def load(self) -> Optional[Tuple[bytes, int, int]]:
+        try:
+            return thumb_store(Path(self.store)).read(self.slot, self.key)
+        except OSError:
+            return None
+
+_stores: Dict[str, ThumbStore] = {}
+_stores_lock = threading.Lock()
+
+def thumb_store(path: Path) -> ThumbStore:
+    """Process-wide store per file, shared by scan workers and the gallery."""
+    with _stores_lock:
+        store = _stores.get(str(path))
+        if store is None:
+            store = _stores[str(path)] = ThumbStore(path)
+        return store
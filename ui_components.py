@@ -1,51 +1,268 @@
 
+from collections import OrderedDict
 from pathlib import Path
 from typing import List, Dict, Optional
 
-from PySide6.QtCore import Qt, QSize, QRect, QPoint
+from PySide6.QtCore import (
+    Qt, QSize, QRect, QPoint, QAbstractListModel, QModelIndex, QSortFilterProxyModel, QTimer, Signal
+)
 from PySide6.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QCursor
-from PySide6.QtWidgets import QWidget, QListWidget, QListWidgetItem
+from PySide6.QtWidgets import QWidget, QListView
 from PIL import Image
 
-class ThumbnailGallery(QListWidget):
+STATUS_COLORS = {"PASS": QColor(0,64,0), "FAIL": QColor(64,0,0), "DUPLICATE": QColor(64,64,0)}
+ItemRole = Qt.UserRole + 1
+IdRole = Qt.UserRole + 2
+
+class PixmapLRU:
+    """Bounded id -> QPixmap cache; only thumbnails that get painted are converted."""
+    def __init__(self, capacity: int = 2000):
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, QPixmap]" = OrderedDict()
+
+    def get(self, key: str, make) -> QPixmap:
+        pm = self.entries.get(key)
+        if pm is None:
+            pm = self.entries[key] = make()
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return pm
+
+    def discard(self, key: str):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+def pending_item(path: str) -> Dict:
+    """Gallery placeholder for a discovered file that has not been scanned yet."""
+    return {"path": path, "name": Path(path).name, "status": "PENDING", "pending": True}
+
+def item_thumbnail(it: Dict) -> QImage:
+    """The item's thumbnail, read from the thumbnail store if it was not kept in memory."""
+    if "thumbnail_qimage" in it:
+        return it["thumbnail_qimage"]
+    got = it["thumb_ref"].load() if it.get("thumb_ref") else None
+    if got is None:
+        return QImage()
+    data, w, h = got
+    return QImage(data, w, h, w * 3, QImage.Format.Format_RGB888).copy()
+
+class ThumbnailModel(QAbstractListModel):
+    """Scan items keyed by path; row lookup by id is a dict hit."""
+    def __init__(self, parent=None, cache_items: int = 2000):
+        super().__init__(parent)
+        self.items: List[Dict] = []
+        self.rows: Dict[str, int] = {}
+        self.pixmaps = PixmapLRU(cache_items)
+        self.placeholder = QPixmap()  # icon-sized blank for pending items, so cells keep their size
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        it = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            return it["name"]
+        if role == Qt.DecorationRole:
+            if it.get("pending"):
+                return self.placeholder
+            return self.pixmaps.get(it["path"], lambda: QPixmap.fromImage(item_thumbnail(it)))
+        if role == Qt.ToolTipRole:
+            mode = it.get("scan_mode", "full")
+            return f"{it['name']}\n{it['status']}" + ("" if mode == "full" else f" ({mode} scores)")
+        if role == Qt.BackgroundRole:
+            return STATUS_COLORS.get(it["status"])
+        if role == ItemRole:
+            return it
+        if role == IdRole:
+            return it["path"]
+        return None
+
+    def set_items(self, items: List[Dict]):
+        self.beginResetModel()
+        self.items = list(items)
+        self.rows = {it["path"]: i for i, it in enumerate(self.items)}
+        self.pixmaps.clear()
+        self.endResetModel()
+
+    def add_items(self, items: List[Dict]):
+        fresh = {}  # a later item for the same path (scanned after its placeholder) replaces it in place
+        for it in items:
+            row = self.rows.get(it["path"])
+            if row is None:
+                fresh[it["path"]] = it
+            else:
+                self.update_item(it)
+        if not fresh:
+            return
+        fresh = list(fresh.values())
+        first = len(self.items)
+        self.beginInsertRows(QModelIndex(), first, first + len(fresh) - 1)
+        for i, it in enumerate(fresh):
+            self.rows[it["path"]] = first + i
+        self.items.extend(fresh)
+        self.endInsertRows()
+
+    def update_item(self, it: Dict):
+        row = self.rows.get(it["path"])
+        if row is None:
+            return
+        self.items[row] = it
+        self.pixmaps.discard(it["path"])
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx)
+
+    def remove_items(self, ids: List[str]):
+        for row in sorted((self.rows[i] for i in ids if i in self.rows), reverse=True):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            it = self.items.pop(row)
+            self.pixmaps.discard(it["path"])
+            self.endRemoveRows()
+        self.rows = {it["path"]: i for i, it in enumerate(self.items)}
+
+    def item_by_id(self, item_id: str) -> Optional[Dict]:
+        row = self.rows.get(item_id)
+        return None if row is None else self.items[row]
+
+class StatusFilterProxy(QSortFilterProxyModel):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setViewMode(QListWidget.IconMode)
-        self.setResizeMode(QListWidget.Adjust)
+        self.status = "All"
+
+    def set_status(self, status: str):
+        self.status = status
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, row, parent):
+        if self.status == "All":
+            return True
+        return self.sourceModel().items[row].get("status") == self.status
+
+class ThumbnailGallery(QListView):
+    """
+    Virtualized thumbnail grid: only visible rows are laid out and painted.
+    Items streamed in during a scan are appended in batches, replacing the
+    pending placeholders of the same path. viewport_changed fires (at most
+    every 150 ms) when scrolling or new rows change what is on screen.
+    """
+    selection_changed = Signal()
+    viewport_changed = Signal()
+
+    def __init__(self, parent=None, cache_items: int = 2000):
+        super().__init__(parent)
+        self.setViewMode(QListView.IconMode)
+        self.setResizeMode(QListView.Adjust)
         self.setIconSize(QSize(180,180))
         self.setSpacing(8)
-        self.setMovement(QListWidget.Static)
+        self.setMovement(QListView.Static)
         self.setWordWrap(True)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(200)
+        self.model_ = ThumbnailModel(self, cache_items)
+        self.model_.placeholder = QPixmap(self.iconSize())
+        self.model_.placeholder.fill(QColor(40,40,40))
+        self.proxy = StatusFilterProxy(self)
+        self.proxy.setSourceModel(self.model_)
+        self.setModel(self.proxy)
+        self.selectionModel().selectionChanged.connect(lambda *_: self.selection_changed.emit())
+        self.pending: List[Dict] = []
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(100)
+        self.flush_timer.timeout.connect(self.flush)
+        self.viewport_timer = QTimer(self)
+        self.viewport_timer.setSingleShot(True)
+        self.viewport_timer.setInterval(150)
+        self.viewport_timer.timeout.connect(self.viewport_changed)
+        self.verticalScrollBar().valueChanged.connect(self._viewport_moved)
+        self.proxy.rowsInserted.connect(self._viewport_moved)
+        self.proxy.modelReset.connect(self._viewport_moved)
+
+    def _viewport_moved(self, *_):
+        if not self.viewport_timer.isActive():
+            self.viewport_timer.start()
+
+    def resizeEvent(self, e):
+        super().resizeEvent(e)
+        self._viewport_moved()
 
     def populate(self, items: List[Dict]):
-        self.clear()
-        for it in items:
-            li = QListWidgetItem()
-            li.setText(it["name"])
-            li.setToolTip(f"{it['name']}\n{it['status']}")
-            pm = QPixmap.fromImage(it["thumbnail_qimage"])
-            li.setIcon(pm)
-            if it["status"] == "PASS":
-                li.setBackground(QColor(0,64,0))
-            elif it["status"] == "FAIL":
-                li.setBackground(QColor(64,0,0))
-            elif it["status"] == "DUPLICATE":
-                li.setBackground(QColor(64,64,0))
-            self.addItem(li)
+        self.pending.clear()
+        self.model_.set_items(items)
 
     def add_thumb(self, it: Dict):
-        li = QListWidgetItem()
-        li.setText(it["name"])
-        li.setToolTip(f"{it['name']}\n{it['status']}")
-        pm = QPixmap.fromImage(it["thumbnail_qimage"])
-        li.setIcon(pm)
-        if it["status"] == "PASS":
-            li.setBackground(QColor(0,64,0))
-        elif it["status"] == "FAIL":
-            li.setBackground(QColor(64,0,0))
-        elif it["status"] == "DUPLICATE":
-            li.setBackground(QColor(64,64,0))
-        self.addItem(li)
+        self.pending.append(it)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def add_pending(self, paths: List[str]):
+        for p in paths:
+            self.add_thumb(pending_item(p))
+
+    def flush(self):
+        items, self.pending = self.pending, []
+        self.model_.add_items(items)
+
+    def clear(self):
+        self.populate([])
+
+    def update_items(self, changed: List[Dict], removed: List[str]):
+        """Applies a rescan: replaces or appends `changed`, drops `removed` ids."""
+        self.flush()
+        self.model_.remove_items(removed)
+        self.model_.add_items(changed)
+
+    def set_filter(self, status: str):
+        self.proxy.set_status(status)
+
+    def set_cache_items(self, n: int):
+        self.model_.pixmaps.capacity = n
+
+    def item_by_id(self, item_id: str) -> Optional[Dict]:
+        return self.model_.item_by_id(item_id)
+
+    def neighbour_items(self, n: int) -> List[Dict]:
+        """Up to n items after and before the current one in view order, nearest first."""
+        cur = self.currentIndex()
+        if not cur.isValid():
+            return []
+        rows = self.model().rowCount()
+        out = []
+        for d in range(1, n + 1):
+            for r in (cur.row() + d, cur.row() - d):
+                if 0 <= r < rows:
+                    out.append(self.model().index(r, 0).data(ItemRole))
+        return out
+
+    def visible_items(self) -> List[Dict]:
+        """Items whose cells intersect the viewport, in view order."""
+        model, height = self.model(), self.viewport().height()
+        # Rows are laid out in order, so the first visible one is found by bisection
+        lo, hi = 0, model.rowCount()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            r = self.visualRect(model.index(mid, 0))
+            if r.isValid() and r.bottom() < 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        out = []
+        for row in range(lo, model.rowCount()):
+            r = self.visualRect(model.index(row, 0))
+            if not r.isValid() or r.top() >= height:
+                break
+            out.append(model.index(row, 0).data(ItemRole))
+        return out
+
+    def current_item(self) -> Optional[Dict]:
+        rows = self.selectionModel().selectedIndexes()
+        return rows[0].data(ItemRole) if rows else None
 
 class CropOverlay(QWidget):
     def __init__(self, parent=None):
@@ -57,18 +274,32 @@ class CropOverlay(QWidget):
         self.handle = None
         self.handle_size = 10
         self.image = QPixmap()
+        self.subject = None
 
     def set_pixmap(self, pm: QPixmap):
         self.image = pm
+        self.subject = None
         iw, ih = pm.width(), pm.height()
         self.rect = QRect(iw//4, ih//4, iw//2, ih//2)
         self.update()
 
+    def set_subject(self, det):
+        """Shows a subject Detection (pixmap coordinates) and starts the crop on its square."""
+        self.subject = det
+        x, y, side = det.crop_square(self.image.width(), self.image.height())
+        self.rect = QRect(x, y, side, side)
+        self.update()
+
     def paintEvent(self, e):
         if self.image.isNull():
             return
         p = QPainter(self)
         p.drawPixmap(0,0,self.image)
+        if self.subject is not None and self.subject.score > 0:
+            x, y, w, h = self.subject.bbox
+            p.setPen(QPen(QColor(255,200,0), 1, Qt.DashLine))
+            p.drawRect(QRect(x, y, w, h))
+            p.drawText(x + 4, y + 14, f"{self.subject.detector} {self.subject.score:.2f}")
         p.setPen(QPen(QColor(0,255,0), 2, Qt.SolidLine))
         p.drawRect(self.rect)
         hs = self.handle_size
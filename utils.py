@@ -21,8 +21,32 @@ class AppSettings:
         "buckets": [1024,1152,1216],
         "autofix": True,
         "enable_intelligent_crop": True,
+        "subject_detectors": "haar_face,saliency",
+        "detect_proxy_side": 512,
         "vlm_cropper_prompt": "Find the bounding box for the main subject. Respond ONLY with a single JSON object in the format: {\"bbox\": [x1, y1, x2, y2]}",
         "max_upscale_factor": 2.0,
+        "scan_cache_enabled": True,
+        "scan_cache_path": "",
+        "scan_backend": "threads",
+        "scan_workers": 0,
+        "scan_chunk_size": 16,
+        "fast_scan": False,
+        "discovery_workers": 8,
+        "inode_order": False,
+        "max_inflight": 0,
+        "memory_budget_mb": 0,
+        "watch": False,
+        "watch_interval": 2.0,
+        "watch_backend": "auto",
+        "watch_export": False,
+        "analysis_side": 1024,
+        "decoded_cache_mb": 1024,
+        "thumb_cache_items": 2000,
+        "preview_cache_items": 32,
+        "preview_prefetch": 2,
+        "text_reports": False,
+        "placement": "hardlink",
+        "output_profile": "png",
         "enable_deblock": True,
         "metadata_template": {
             "Artist": "",
@@ -38,6 +62,17 @@ class AppSettings:
             "rename_pattern": "{prefix}{index:05d}_{slug}",
             "save_captions": True,
             "vision_mode": False,
+            "combined_request": False,
+            "caption_concurrency": 4,
+            "caption_queue_size": 64,
+            "defer_captions": False,
+            "cache_captions": True,
+            "payload_max_side": 1024,
+            "payload_format": "jpeg",
+            "payload_quality": 90,
+            "caption_cache_max_entries": 100000,
+            "max_in_flight": 2,
+            "retries": 3,
             "caption_prompt_pass": "Describe the image in 1–2 sentences for LoRA training: subject, pose, style, lighting, setting. Avoid punctuation-heavy prose.",
             "caption_prompt_rescued": "Provide a concise 1–2 sentence caption suitable for training on a cleaned/restored image. Focus on core visual content only.",
             "tags_prompt": "Return a comma-separated list of 8–15 short tags (no #) describing subject, style, media, lighting, composition, mood."
@@ -0,0 +1,151 @@
+import os, threading
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from PySide6.QtCore import QObject, Signal
+
+from discovery import discover, IMAGE_EXTS
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # optional; polling is used instead
+    Observer = None
+    FileSystemEventHandler = object
+
+Signature = Tuple[int, int]
+
+def snapshot(folder: Path, workers: int = 8) -> Dict[str, Signature]:
+    snap = {}
+    for batch in discover(folder, workers=workers):
+        for p in batch:
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            snap[str(p)] = (st.st_size, st.st_mtime_ns)
+    return snap
+
+class _DirtyHandler(FileSystemEventHandler):
+    def __init__(self, dirty: Set[str], lock: threading.Lock):
+        super().__init__()
+        self.dirty = dirty
+        self.lock = lock
+
+    def on_any_event(self, event):
+        with self.lock:
+            self.dirty.add(event.src_path)
+            if getattr(event, "dest_path", ""):
+                self.dirty.add(event.dest_path)
+
+class FolderWatcher(QObject):
+    """
+    Reports added/modified and deleted images under a folder. With watchdog
+    installed (and backend "auto") filesystem events only mark paths dirty;
+    otherwise the tree is re-walked every `interval` seconds. A file is
+    reported once its size and mtime are unchanged across two checks, so
+    copies still in progress are not scanned half-written. Given the
+    signatures files had when they were scanned, the first check (a full
+    walk on the watcher thread) also reports files that changed since.
+    """
+    changes = Signal(list, list)  # changed paths, deleted paths
+    backend_name = "poll"
+
+    def __init__(self, folder: Path, interval: float = 2.0, backend: str = "auto", workers: int = 8):
+        super().__init__()
+        self.folder = Path(folder)
+        self.interval = interval
+        self.workers = workers
+        self.known: Dict[str, Signature]|None = {}
+        self.unsettled: Dict[str, Signature] = {}
+        self.dirty: Set[str] = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.observer = None
+        if backend == "auto" and Observer is not None:
+            self.backend_name = "watchdog"
+        self.thread = threading.Thread(target=self._run, name="folder-watch", daemon=True)
+
+    def start(self, known: Dict[str, Signature]|None = None):
+        """`known`: scan-time signatures; without them the folder as it is now is the baseline."""
+        self.known = dict(known) if known is not None else None
+        if self.backend_name == "watchdog":
+            try:
+                self.observer = Observer()
+                self.observer.schedule(_DirtyHandler(self.dirty, self.lock), str(self.folder), recursive=True)
+                self.observer.start()
+            except Exception as e:
+                print(f"Watchdog unavailable, polling instead: {e}")
+                self.observer, self.backend_name = None, "poll"
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _current(self, full: bool = False) -> Dict[str, Signature]:
+        """Signatures for the paths worth checking this round (missing ones are absent)."""
+        if self.observer is None or full:
+            return snapshot(self.folder, self.workers)
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+        dirty |= set(self.unsettled)
+        cur = {}
+        for p in dirty:
+            if os.path.isdir(p):
+                # a directory moved in brings files without per-file events
+                cur.update(snapshot(Path(p), self.workers))
+                continue
+            if os.path.splitext(p)[1].lower() not in IMAGE_EXTS:
+                continue
+            try:
+                st = os.stat(p)
+                cur[p] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        # dirty files that are gone were deleted; a dirty non-image path may be a removed directory
+        gone = {d for d in dirty if d in self.known and d not in cur}
+        prefixes = tuple(d + os.sep for d in dirty if os.path.splitext(d)[1].lower() not in IMAGE_EXTS)
+        if prefixes:
+            gone.update(k for k in self.known if k.startswith(prefixes) and k not in cur)
+        return {**{k: v for k, v in self.known.items() if k not in gone}, **cur}
+
+    def poll(self, full: bool = False) -> Tuple[List[str], List[str]]:
+        """One check (a full walk if `full`); returns (changed, deleted) that have settled."""
+        cur = self._current(full)
+        deleted = [p for p in self.known if p not in cur]
+        changed = []
+        for p, sig in cur.items():
+            if self.known.get(p) == sig:
+                self.unsettled.pop(p, None)
+            elif self.unsettled.get(p) == sig:
+                changed.append(p)
+                self.known[p] = sig
+                del self.unsettled[p]
+            else:
+                self.unsettled[p] = sig
+        for p in deleted:
+            del self.known[p]
+            self.unsettled.pop(p, None)
+        for p in [p for p in self.unsettled if p not in cur]:
+            del self.unsettled[p]
+        return changed, deleted
+
+    def _run(self):
+        # with scan-time signatures the first check walks the whole tree right away
+        full = self.known is not None
+        if not full:
+            self.known = snapshot(self.folder, self.workers)
+        while full or not self.stop_event.wait(self.interval):
+            check_full, full = full, False
+            try:
+                changed, deleted = self.poll(check_full)
+            except Exception as e:
+                print(f"Watch check failed: {e}")
+                continue
+            if changed or deleted:
+                self.changes.emit(sorted(changed), sorted(deleted))
@@ -1,21 +1,30 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, replace
 from pathlib import Path
 from typing import List, Tuple, Dict
-import fnmatch, csv
-import imagehash
+import fnmatch, os, threading
+from concurrent.futures import ProcessPoolExecutor, CancelledError, FIRST_COMPLETED, wait
+import multiprocessing
 from PySide6.QtCore import QObject, Signal, QRunnable, QThreadPool, Slot
-from PIL import PngImagePlugin
 
 from PySide6.QtGui import QImage
 from image_processing import (
-    load_image_fix, pil_to_cv, passes_basic_rules, auto_rotate,
-    phash64, phash_distance, score_image, bucket_square, cv_to_pil,
-    auto_fix_to_standard, intelligent_square_crop
+    pil_to_cv, passes_basic_rules, bucket_square, cv_to_pil,
+    auto_fix_to_standard, intelligent_square_crop, scores_from_metrics,
+    analyze_image, analyze_batch, analysis_thresholds
 )
+from scan_cache import ScanCache, default_cache_path
+from discovery import discover
+from scheduler import (WorkScheduler, CancelToken, Cancelled, header_dims, estimate_bytes,
+                       PRIORITY_VISIBLE, PRIORITY_SELECTED, PRIORITY_NORMAL)
+from phash_index import duplicate_clusters, IncrementalClusters
+from image_cache import load_image_cached
 from utils import slugify
-from caption_providers import (
-    lmstudio_caption, lmstudio_tags, lmstudio_describe, lmstudio_get_bbox
-)
+from caption_providers import lmstudio_describe, lmstudio_get_bbox, configure_lmstudio
+from caption_stage import CaptionStage, CaptionJob, combined_fields, caption_prompts
+from export_journal import ExportJournal, settings_fingerprint
+from report_writer import ReportWriter
+from placement import place_file
+from output_profiles import get_profile, encode_image
 
 @dataclass
 class ScanConfig:
@@ -32,6 +41,49 @@ class ScanConfig:
     sel_min_score: float = 90.0
     include_globs: str = ""  # comma-separated globs
     exclude_globs: str = ""  # comma-separated globs
+    use_cache: bool = True
+    cache_path: str = ""  # empty = ~/.jewels_scan_cache.sqlite
+    cache_verify_hash: bool = False
+    backend: str = "threads"  # "threads" (QThreadPool) or "processes"
+    workers: int = 0  # process backend only; 0 = one per CPU
+    chunk_size: int = 16  # paths per process-pool task
+    fast_scan: bool = False  # reduced-resolution decode + analysis
+    analysis_side: int = 1024  # long edge of the fast-scan analysis buffer
+    discovery_workers: int = 8  # parallel os.scandir threads for the folder walk
+    inode_order: bool = False  # scan each directory in inode order (spinning disks)
+    max_inflight: int = 0  # items decoding at once; 0 = twice the pool's threads
+    memory_budget_mb: int = 0  # estimated working set admitted at once; 0 = half of RAM
+
+def scan_config_from_settings(d: dict, **overrides) -> ScanConfig:
+    """ScanConfig from settings data, shared by the GUI and the CLI; `overrides` replace single fields."""
+    cfg = ScanConfig(
+        pass_threshold=float(d.get("pass_threshold", 95.0)),
+        sel_min_score=float(d.get("select_min_score", 90.0)),
+        include_globs=d.get("include_globs", ""),
+        exclude_globs=d.get("exclude_globs", ""),
+        dedupe_tol=d.get("dedupe_tol", 8),
+        w_sharp=d.get("w_sharp", 0.5),
+        w_contrast=d.get("w_contrast", 0.3),
+        w_noise=d.get("w_noise", 0.2),
+        blur_target=d.get("blur_target", 150.0),
+        noise_max=d.get("noise_max", 12.0),
+        use_cache=d.get("scan_cache_enabled", True),
+        cache_path=d.get("scan_cache_path", ""),
+        backend=d.get("scan_backend", "threads"),
+        workers=d.get("scan_workers", 0),
+        chunk_size=d.get("scan_chunk_size", 16),
+        fast_scan=d.get("fast_scan", False),
+        analysis_side=d.get("analysis_side", 1024),
+        discovery_workers=d.get("discovery_workers", 8),
+        inode_order=d.get("inode_order", False),
+        max_inflight=d.get("max_inflight", 0),
+        memory_budget_mb=d.get("memory_budget_mb", 0),
+    )
+    return replace(cfg, **overrides)
+
+# Pixel-buffer copies alive at the peak of each pipeline, in units of w*h*3 bytes
+SCAN_COPIES = 10.0    # decode, BGR copy, rotation, 3-channel float64 Laplacian
+EXPORT_COPIES = 5.0   # decode, auto-fix, crop, bucket resize, encode buffer
 
 def _megapixels(w: int, h: int) -> float:
     return (w*h)/1_000_000.0
@@ -39,104 +91,464 @@ def _megapixels(w: int, h: int) -> float:
 class ScanSignals(QObject):
     image_scanned = Signal(dict)
     progress = Signal(int)
+    found = Signal(list)     # paths added to the running total
+    discovered = Signal()    # folder walk finished
     finished = Signal()
 
+def scan_variant(cfg: ScanConfig) -> str:
+    return f"fast{cfg.analysis_side}" if cfg.fast_scan else "full"
+
+def build_scan_item(p: Path, record: dict, cfg: ScanConfig) -> dict:
+    w, h = record["width"], record["height"]
+    status = "PASS" if passes_basic_rules(w, h, cfg.min_side, cfg.aspect_min, cfg.aspect_max) else "FAIL"
+    sharp_target, noise_max = analysis_thresholds(cfg.blur_target, cfg.noise_max, record.get("analysis_scale", 1.0))
+    scores = scores_from_metrics(record["metrics"], sharp_target=sharp_target, noise_max=noise_max,
+                                 w_sharp=cfg.w_sharp, w_contrast=cfg.w_contrast, w_noise=cfg.w_noise)
+    item = {
+        "name": p.name, "path": str(p), "width": w, "height": h,
+        "mp": _megapixels(w, h),
+        "status": status, "duplicate_of": None, "scores": scores,
+        "phash": record["phash"],
+        # fast-scan scores only rank against other fast-scan scores
+        "scan_mode": scan_variant(cfg)
+    }
+    if record.get("signature"):
+        # (size, mtime_ns) the metrics belong to; seeds the folder watcher
+        item["signature"] = tuple(record["signature"])
+    if record.get("thumb_ref") is not None:
+        # Paged in from the thumbnail store when the gallery paints it
+        item["thumb_ref"] = record["thumb_ref"]
+    else:
+        tw, th = record["thumb_size"]
+        item["thumbnail_qimage"] = QImage(record["thumb"], tw, th, tw * 3, QImage.Format.Format_RGB888).copy()
+    return item
+
+def _glob_match(path: str, globs: str) -> bool:
+    path = path.lower().replace("\\","/")
+    return any(fnmatch.fnmatch(path, pat.strip().lower()) for pat in globs.split(","))
+
+def scan_priority(p: Path, cfg: ScanConfig) -> int:
+    """Files the include globs select are analysed before the rest."""
+    if cfg.include_globs and _glob_match(str(p), cfg.include_globs) and not _glob_match(str(p), cfg.exclude_globs):
+        return PRIORITY_SELECTED
+    return PRIORITY_NORMAL
+
 class ScanImageRunnable(QRunnable):
-    def __init__(self, p: Path, cfg: ScanConfig, signals: ScanSignals):
+    def __init__(self, p: Path, cfg: ScanConfig, signals: ScanSignals, cache: ScanCache|None=None,
+                 token: CancelToken|None=None, check_cache: bool=True):
         super().__init__()
         self.p = p
         self.cfg = cfg
         self.signals = signals
+        self.cache = cache
+        self.token = token or CancelToken()
+        self.check_cache = check_cache  # False: already a known miss, the cache only stores the result
+
+    def skip(self):
+        """Counts the file as done without scanning it (dropped from the queue by a cancel)."""
+        self.signals.progress.emit(1)
 
     def run(self):
         try:
-            im = load_image_fix(self.p)
-            w, h = im.size
-            thumb_im = im.copy()
-            thumb_im.thumbnail((180, 180))
-            if thumb_im.mode != "RGB":
-                thumb_im = thumb_im.convert("RGB")
-            qimg = QImage(thumb_im.tobytes(), thumb_im.width, thumb_im.height, thumb_im.width * 3, QImage.Format.Format_RGB888)
-
-            status = "PASS" if passes_basic_rules(w, h, self.cfg.min_side, self.cfg.aspect_min, self.cfg.aspect_max) else "FAIL"
-            hsh_obj = imagehash.phash(im, hash_size=16)
-            hsh = str(hsh_obj)
-
-            cv = pil_to_cv(im)
-            cv_rot = auto_rotate(cv)
-            scores = score_image(cv_rot, sharp_target=self.cfg.blur_target, noise_max=self.cfg.noise_max,
-                                 w_sharp=self.cfg.w_sharp, w_contrast=self.cfg.w_contrast, w_noise=self.cfg.w_noise)
-            item = {
-                "name": self.p.name, "path": str(self.p), "width": w, "height": h,
-                "mp": _megapixels(w, h),
-                "status": status, "duplicate_of": None, "scores": scores,
-                "thumbnail_qimage": qimg, "phash": hsh
-            }
-            self.signals.image_scanned.emit(item)
+            self.token.check()
+            record = None
+            if self.cache is not None and self.check_cache:
+                try:
+                    record = self.cache.get(self.p, scan_variant(self.cfg))
+                except Exception:
+                    record = None
+            if record is None:
+                record = analyze_image(self.p, self.cfg.fast_scan, self.cfg.analysis_side, load_image_cached)
+                if self.cache is not None:
+                    try:
+                        record["thumb_ref"] = self.cache.put(self.p, record, scan_variant(self.cfg))
+                    except Exception as e:
+                        print(f"Scan cache write failed for {self.p.name}: {e}")
+            self.signals.image_scanned.emit(build_scan_item(self.p, record, self.cfg))
         except Exception:
             pass
         finally:
             self.signals.progress.emit(1)
 
+def scan_cost(p: Path) -> int:
+    """Estimated peak bytes to analyse p, from its header (the float64 Laplacian dominates)."""
+    try:
+        w, h, bands = header_dims(p)
+    except Exception:
+        return 0
+    return estimate_bytes(w, h, bands, SCAN_COPIES)
+
+def submit_scan(scheduler: WorkScheduler, p: Path, cfg: ScanConfig, signals: ScanSignals, cache: ScanCache|None,
+                token: CancelToken|None=None):
+    """
+    Cache hits are emitted here; misses are queued on the scheduler with
+    their decode cost and priority, keyed by path so they can be promoted.
+    """
+    record = None
+    if cache is not None:
+        try:
+            record = cache.get(p, scan_variant(cfg))
+        except Exception:
+            record = None
+    if record is None:
+        scheduler.submit(ScanImageRunnable(p, cfg, signals, cache, token, check_cache=False), scan_cost(p),
+                         scan_priority(p, cfg), str(p))
+        return
+    try:
+        signals.image_scanned.emit(build_scan_item(p, record, cfg))
+    finally:
+        signals.progress.emit(1)
+
+class DiscoveryRunnable(QRunnable):
+    """
+    Streams the folder walk into the scan: each discovered batch is counted
+    (signals.found) and its files are handed to the scheduler right away.
+    The walk stops at the next directory once the token is cancelled.
+    """
+    def __init__(self, folder: Path, cfg: ScanConfig, signals: ScanSignals, cache: ScanCache|None,
+                 scheduler: WorkScheduler, token: CancelToken|None=None):
+        super().__init__()
+        self.folder = folder
+        self.cfg = cfg
+        self.signals = signals
+        self.cache = cache
+        self.scheduler = scheduler
+        self.token = token or CancelToken()
+
+    def run(self):
+        try:
+            for batch in discover(self.folder, workers=self.cfg.discovery_workers, inode_order=self.cfg.inode_order):
+                if self.token.cancelled:
+                    break
+                # found is queued before any progress from these files
+                self.signals.found.emit([str(p) for p in batch])
+                for p in batch:
+                    submit_scan(self.scheduler, p, self.cfg, self.signals, self.cache, self.token)
+        except Exception as e:
+            print(f"File discovery failed: {e}")
+        finally:
+            self.signals.discovered.emit()
+
+class ProcessScanRunnable(QRunnable):
+    """
+    Drives a process pool for the scan while the folder is still being
+    walked. Only paths go to the workers and only compact records come back;
+    cache hits never leave this thread and items are still delivered through
+    ScanSignals. On cancel, chunks not yet started are dropped; chunks a
+    worker already holds run to the end.
+    """
+    def __init__(self, folder: Path, cfg: ScanConfig, signals: ScanSignals, cache: ScanCache|None=None,
+                 token: CancelToken|None=None):
+        super().__init__()
+        self.folder = folder
+        self.cfg = cfg
+        self.signals = signals
+        self.cache = cache
+        self.token = token or CancelToken()
+
+    def _emit(self, p: Path, record: dict|None):
+        try:
+            if record is not None:
+                self.signals.image_scanned.emit(build_scan_item(p, record, self.cfg))
+        finally:
+            self.signals.progress.emit(1)
+
+    def _collect(self, futures: dict, block: bool) -> int:
+        """
+        Handles finished chunks (waits for all of them if block); returns how
+        many paths were emitted. Once cancelled, chunks not yet started are
+        dropped and come back as failed paths.
+        """
+        emitted = 0
+        while futures:
+            if self.token.cancelled:
+                for fut in futures:
+                    fut.cancel()
+            ready, _ = wait(futures, timeout=0.25 if block else 0, return_when=FIRST_COMPLETED)
+            emitted += self._emit_chunks(futures, ready)
+            if not block:
+                break
+        return emitted
+
+    def _emit_chunks(self, futures: dict, ready) -> int:
+        emitted = 0
+        for fut in ready:
+            chunk = futures.pop(fut)
+            try:
+                results = fut.result()
+            except CancelledError:
+                results = [(str(p), None) for p in chunk]
+            except Exception as e:
+                print(f"Scan worker failed: {e}")
+                results = [(str(p), None) for p in chunk]
+            for path, record in results:
+                p = Path(path)
+                if record is not None and self.cache is not None:
+                    try:
+                        record["thumb_ref"] = self.cache.put(p, record, scan_variant(self.cfg))
+                    except Exception as e:
+                        print(f"Scan cache write failed for {p.name}: {e}")
+                self._emit(p, record)
+            emitted += len(results)
+        return emitted
+
+    def run(self):
+        workers = self.cfg.workers or os.cpu_count() or 1
+        chunk = max(1, self.cfg.chunk_size)
+        ex = None
+        futures = {}
+        misses = []
+        pending = 0
+        try:
+            for batch in discover(self.folder, workers=self.cfg.discovery_workers, inode_order=self.cfg.inode_order):
+                if self.token.cancelled:
+                    break
+                self.signals.found.emit([str(p) for p in batch])
+                for p in batch:
+                    record = None
+                    if self.cache is not None:
+                        try:
+                            record = self.cache.get(p, scan_variant(self.cfg))
+                        except Exception:
+                            record = None
+                    if record is None:
+                        misses.append(p)
+                        pending += 1
+                    else:
+                        self._emit(p, record)
+                # Flush the remainder too once the walk is done
+                while len(misses) >= chunk:
+                    if ex is None:
+                        # spawn: forking a process that already runs Qt threads is unsafe
+                        ex = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                    batch_paths, misses = misses[:chunk], misses[chunk:]
+                    futures[ex.submit(analyze_batch, [str(p) for p in batch_paths],
+                                      self.cfg.fast_scan, self.cfg.analysis_side)] = batch_paths
+                pending -= self._collect(futures, block=False)
+            if self.token.cancelled:
+                for _ in misses:
+                    self.signals.progress.emit(1)
+                pending -= len(misses)
+                misses = []
+            if misses:
+                if ex is None:
+                    ex = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                futures[ex.submit(analyze_batch, [str(p) for p in misses],
+                                  self.cfg.fast_scan, self.cfg.analysis_side)] = misses
+            pending -= self._collect(futures, block=True)
+        except Exception as e:
+            print(f"Process scan backend failed: {e}")
+            for _ in range(pending):
+                self.signals.progress.emit(1)
+        finally:
+            if ex is not None:
+                ex.shutdown(cancel_futures=True)
+            self.signals.discovered.emit()
+
 class ScanManager(QObject):
     image_scanned = Signal(dict)
     progress = Signal(int, int)
     finished = Signal(list)
+    updated = Signal(list, list)  # rescan: new or re-labelled items, removed paths
+    found = Signal(list)  # discovered paths, before they are scanned
 
     def __init__(self, folder: Path, cfg: ScanConfig):
         super().__init__()
         self.folder = folder
         self.cfg = cfg
         self.pool = QThreadPool.globalInstance()
+        self.scheduler = WorkScheduler(self.pool, cfg.max_inflight, cfg.memory_budget_mb)
+        self.token = CancelToken()
+        self.visible: set = set()
+        self.seen: set = set()  # every discovered path, to prune the cache of vanished ones
         self.signals = ScanSignals()
         self.signals.image_scanned.connect(self.on_image_scanned)
         self.done = 0
         self.total = 0
+        self.walking = True
         self.results = []
+        self.by_path: Dict[str, dict] = {}
+        self.clusters: IncrementalClusters|None = None
+        self.rescan_signals = ScanSignals()
+        self.rescan_signals.image_scanned.connect(self.on_rescanned)
+        self.rescan_signals.progress.connect(self.on_rescan_progress)
+        self.rescan_left = 0
+        self.rescan_items: List[dict] = []
+        self.rescan_deleted: List[str] = []
+        self.cache = self._open_cache()
+
+    def _open_cache(self) -> ScanCache|None:
+        if not self.cfg.use_cache:
+            return None
+        try:
+            return ScanCache(Path(self.cfg.cache_path) if self.cfg.cache_path else default_cache_path(),
+                             verify_hash=self.cfg.cache_verify_hash)
+        except Exception as e:
+            print(f"Scan cache unavailable: {e}")
+            return None
 
     def on_image_scanned(self, item):
         self.results.append(item)
         self.image_scanned.emit(item)
 
     def run(self):
-        exts = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}
-        files = [p for p in self.folder.rglob("*") if p.suffix.lower() in exts]
-        self.total = len(files)
+        # Files are scanned as the walk finds them; total grows until discovered
         self.signals.progress.connect(self.on_progress)
+        self.signals.found.connect(self.on_found)
+        self.signals.discovered.connect(self.on_discovered)
+        if self.cfg.backend == "processes":
+            self.pool.start(ProcessScanRunnable(self.folder, self.cfg, self.signals, self.cache, self.token))
+        else:
+            self.pool.start(DiscoveryRunnable(self.folder, self.cfg, self.signals, self.cache, self.scheduler, self.token))
+
+    def cancel(self):
+        """
+        Stops the scan or rescan: the walk ends, queued files are dropped and
+        running ones stop before analysis if they can. `finished` (or
+        `updated`) still fires, with whatever was scanned.
+        """
+        self.token.cancel()
+        for r in self.scheduler.clear():
+            r.skip()
+
+    def prioritize(self, paths: List[str]):
+        """
+        Scans these queued files next, e.g. the ones visible in the gallery
+        (threads backend). Files prioritized by an earlier call that are not
+        in `paths` go back to their normal place in the queue.
+        """
+        paths = set(paths)
+        for p in self.visible - paths:
+            self.scheduler.reprioritize([p], scan_priority(Path(p), self.cfg))
+        self.scheduler.reprioritize(paths, PRIORITY_VISIBLE)
+        self.visible = paths
+
+    def on_found(self, paths):
+        self.total += len(paths)
+        self.seen.update(paths)
+        self.found.emit(paths)
+        self.progress.emit(self.done, self.total)
 
-        for p in files:
-            runnable = ScanImageRunnable(p, self.cfg, self.signals)
-            self.pool.start(runnable)
+    def on_discovered(self):
+        self.walking = False
+        if self.done == self.total:
+            self.on_finished()
 
     def on_progress(self, v):
         self.done += v
         self.progress.emit(self.done, self.total)
-        if self.done == self.total:
+        if self.done == self.total and not self.walking:
             self.on_finished()
 
     def on_finished(self):
-        # Dedupe must be done after all images are scanned
-        phash_index: List[Tuple[object, dict]] = []
-        for item in sorted(self.results, key=lambda x: x["name"]):
-            hsh_obj = imagehash.hex_to_hash(item["phash"])
-            is_dup = False
-            for old_obj, meta in phash_index:
-                if (hsh_obj - old_obj) <= self.cfg.dedupe_tol:
-                    item["duplicate_of"] = meta["name"]
-                    item["status"] = "DUPLICATE"
-                    is_dup = True
-                    break
-            if not is_dup:
-                phash_index.append((hsh_obj, {"name": item["name"]}))
+        if self.cache is not None:
+            self.cache.flush()
+            if not self.token.cancelled:
+                try:
+                    self.cache.prune(self.folder, self.seen)
+                except Exception as e:
+                    print(f"Scan cache prune failed: {e}")
+        # Dedupe must be done after all images are scanned. Clusters are
+        # transitive; the lowest name in each cluster is kept as the original.
+        ordered = sorted(self.results, key=lambda x: (x["name"], x["path"]))
+        for cluster in duplicate_clusters([it["phash"] for it in ordered], self.cfg.dedupe_tol):
+            root = ordered[min(cluster)]
+            for i in cluster:
+                if ordered[i] is not root:
+                    ordered[i]["duplicate_of"] = root["name"]
+                    ordered[i]["status"] = "DUPLICATE"
+        self.by_path = {it["path"]: it for it in self.results}
         self.finished.emit(self.results)
 
+    def signatures(self) -> Dict[str, Tuple[int, int]]:
+        """(size, mtime_ns) of every scanned file as it was when analysed."""
+        return {it["path"]: it["signature"] for it in self.results if it.get("signature")}
+
+    def rescan(self, changed: List[str], deleted: List[str]):
+        """
+        Scans only `changed` (added or modified) files and forgets `deleted`
+        ones; `updated` then reports every item whose scan or duplicate
+        status changed. Calls made while a rescan runs are merged into it.
+        """
+        if self.token.cancelled:
+            self.token = CancelToken()
+        if self.clusters is None:
+            self.clusters = IncrementalClusters(self.cfg.dedupe_tol)
+            for it in self.results:
+                self.clusters.add(it["path"], it["phash"])
+        self.rescan_deleted += deleted
+        if not changed:
+            # nothing to scan; deletions alone finish now unless a rescan is running
+            if not self.rescan_left:
+                self._finish_rescan()
+            return
+        # counted up front: cache hits report progress (and may finish) inside the loop
+        self.rescan_left += len(changed)
+        for p in changed:
+            submit_scan(self.scheduler, Path(p), self.cfg, self.rescan_signals, self.cache, self.token)
+
+    def on_rescanned(self, item):
+        self.rescan_items.append(item)
+
+    def on_rescan_progress(self, v):
+        self.rescan_left -= v
+        if self.rescan_left == 0:
+            self._finish_rescan()
+
+    def _base_status(self, it: dict) -> str:
+        return "PASS" if passes_basic_rules(it["width"], it["height"], self.cfg.min_side,
+                                            self.cfg.aspect_min, self.cfg.aspect_max) else "FAIL"
+
+    def _finish_rescan(self):
+        if self.cache is not None:
+            self.cache.flush()
+        items, self.rescan_items = self.rescan_items, []
+        deleted, self.rescan_deleted = self.rescan_deleted, []
+        if self.cache is not None and deleted:
+            try:
+                self.cache.forget(deleted)
+            except Exception as e:
+                print(f"Scan cache prune failed: {e}")
+        seeds, touched = [], set()
+        removed = []
+        for p in deleted:
+            old = self.by_path.pop(p, None)
+            if old is not None:
+                seeds.append(old["phash"])
+                self.clusters.remove(p)
+                removed.append(p)
+        for it in items:
+            old = self.by_path.get(it["path"])
+            if old is not None:
+                seeds.append(old["phash"])
+            self.by_path[it["path"]] = it
+            self.clusters.add(it["path"], it["phash"])
+            seeds.append(it["phash"])
+            touched.add(it["path"])
+        # Same rule as the full scan: the lowest name in each cluster is the original
+        for comp in self.clusters.components(seeds):
+            group = [self.by_path[k] for k in comp]
+            root = min(group, key=lambda x: (x["name"], x["path"]))
+            for it in group:
+                status, dup = (self._base_status(it), None) if it is root else ("DUPLICATE", root["name"])
+                if (it["status"], it["duplicate_of"]) != (status, dup):
+                    it["status"], it["duplicate_of"] = status, dup
+                    touched.add(it["path"])
+        self.results = list(self.by_path.values())
+        self.updated.emit([self.by_path[p] for p in sorted(touched)], removed)
+
+MANIFEST_FIELDS = ["name","path","status","bucket","selected_for_training","final_score","dup_of","output"]
+
 class ExportManager(QObject):
     progress = Signal(int, int)
+    caption_progress = Signal(int, int)
     finished = Signal(str)
 
     def __init__(self, items: List[dict], out_dir: Path, buckets=(1024,1152,1216),
                  apply_autofix=True, cfg: ScanConfig|None=None, lm_settings: dict|None=None,
-                 metadata_template: dict|None=None, enable_intelligent_crop: bool=True):
+                 metadata_template: dict|None=None, enable_intelligent_crop: bool=True,
+                 resume: bool=False, text_reports: bool=False, placement: str="hardlink",
+                 output_profile: str="png"):
         super().__init__()
         self.items = items
         self.out_dir = out_dir
@@ -146,13 +558,35 @@ class ExportManager(QObject):
         self.lm_settings = lm_settings or {}
         self.metadata_template = metadata_template or {}
         self.enable_intelligent_crop = enable_intelligent_crop
+        self.resume = resume
+        self.text_reports = text_reports
+        self.placement = placement
+        self.output_profile = output_profile
+        self.journal = None
+        self.reports = None
+        self.skipped = 0
+        self.cancelled = 0
         self.pool = QThreadPool.globalInstance()
+        self.scheduler = WorkScheduler(self.pool, self.cfg.max_inflight, self.cfg.memory_budget_mb)
+        self.token = CancelToken()
+        self.captions = None
+        if self.lm_settings.get("enabled"):
+            configure_lmstudio(self.lm_settings)
+            if self.lm_settings.get("save_captions", True) and not self.lm_settings.get("defer_captions"):
+                self.captions = CaptionStage(
+                    self.lm_settings,
+                    concurrency=int(self.lm_settings.get("caption_concurrency", 4)),
+                    queue_size=int(self.lm_settings.get("caption_queue_size", 64)),
+                    on_done=self.on_caption_done)
         self.done = 0
+        self.failed = 0
         self.total = len(self.items)
-        self.manifest_rows = []
+        self.counts_lock = threading.Lock()  # items report from pool threads (and skip() from the caller's)
 
     def run(self):
         self._prepare_dirs()
+        self.journal = ExportJournal(self.out_dir, self.fingerprint(), resume=self.resume)
+        self.reports = ReportWriter(self.out_dir, MANIFEST_FIELDS)
         # Logic to handle duplicates before exporting
         groups = self._group_duplicates(self.items)
         keepers = set()
@@ -160,27 +594,79 @@ class ExportManager(QObject):
             k = self._keeper_logic(group)
             keepers.add(k["name"])
 
+        if not self.items:
+            self.on_export_finished()
+            return
         for i, item in enumerate(self.items):
-            runnable = ExportImageRunnable(item, i, self.out_dir, self.buckets, self.apply_autofix, self.cfg, self.lm_settings, self.metadata_template, self.enable_intelligent_crop, keepers, self.on_export_progress)
-            self.pool.start(runnable)
-
-    def on_export_progress(self, manifest_row):
-        if manifest_row:
-            self.manifest_rows.append(manifest_row)
-        self.done += 1
-        self.progress.emit(self.done, self.total)
-        if self.done == self.total:
+            runnable = ExportImageRunnable(item, i, self.out_dir, self.buckets, self.apply_autofix, self.cfg, self.lm_settings, self.metadata_template, self.enable_intelligent_crop, keepers, self.on_export_progress, self.captions, self.journal, self.reports, self.text_reports, self.placement, self.output_profile, self.token)
+            # Scan items carry their native size, so no header has to be read here
+            self.scheduler.submit(runnable, estimate_bytes(item.get("width", 0), item.get("height", 0), 3, EXPORT_COPIES))
+
+    def fingerprint(self) -> str:
+        return settings_fingerprint({
+            "buckets": list(self.buckets), "apply_autofix": self.apply_autofix, "cfg": asdict(self.cfg),
+            "lm_settings": self.lm_settings, "metadata_template": self.metadata_template,
+            "enable_intelligent_crop": self.enable_intelligent_crop, "text_reports": self.text_reports,
+            "placement": self.placement, "output_profile": self.output_profile
+        })
+
+    def cancel(self):
+        """
+        Stops the export: queued items are dropped and running ones stop at
+        their next stage, before anything is written. Finished items stay in
+        the journal, so a resumed export picks up the rest.
+        """
+        self.token.cancel()
+        if self.captions is not None:
+            self.captions.drop_pending()
+        for r in self.scheduler.clear():
+            r.skip()
+
+    def on_export_progress(self, manifest_row, skipped=False, cancelled=False, deferred=False):
+        # deferred rows are written by on_caption_done under their final name
+        if manifest_row and not cancelled and not deferred:
+            self.reports.add_row(manifest_row)
+        with self.counts_lock:
+            if skipped:
+                self.skipped += 1
+            if cancelled:
+                self.cancelled += 1
+            elif not manifest_row:
+                self.failed += 1
+            self.done += 1
+            done = self.done
+        self.progress.emit(done, self.total)
+        if done == self.total:
             self.on_export_finished()
 
+    def on_caption_done(self, job, result):
+        if job.record is not None:
+            rec = job.record
+            output = job.saved_path.relative_to(self.out_dir).as_posix()
+            row = dict(rec["row"], output=output)
+            caption = dict(rec["caption"], output=output, stem=job.final_stem)
+            self.journal.record(rec["src"], row, [job.saved_path] + rec["files"][1:], caption, rec["report"])
+            self.reports.add_row(row)
+        self.caption_progress.emit(self.captions.done, self.captions.submitted)
+
     def on_export_finished(self):
-        with open(self.out_dir / "manifest.csv", "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=["name","path","status","bucket","selected_for_training","final_score","dup_of"])
-            w.writeheader()
-            w.writerows(self.manifest_rows)
+        if self.captions is not None:
+            # Every image is encoded. This may run on the GUI thread (a cancel
+            # skips queued items there), so the caption thread drains its queue
+            # and then closes the outputs instead of being joined here.
+            self.captions.close(wait=False, then=self._close_outputs)
+        else:
+            self._close_outputs()
+
+    def _close_outputs(self):
+        if self.journal is not None:
+            self.journal.close()
+        if self.reports is not None:
+            self.reports.close()
         self.finished.emit(str(self.out_dir))
 
     def _prepare_dirs(self):
-        for name in ("pass", "rescued", "maybe", "fail", "duplicates", "reports"):
+        for name in ("pass", "rescued", "maybe", "fail", "duplicates") + (("reports",) if self.text_reports else ()):
             (self.out_dir / name).mkdir(parents=True, exist_ok=True)
 
     def _keeper_logic(self, group: List[dict]) -> dict:
@@ -195,7 +681,10 @@ class ExportManager(QObject):
 
 class ExportImageRunnable(QRunnable):
     def __init__(self, item: dict, index: int, out_dir: Path, buckets, apply_autofix,
-                 cfg, lm_settings, metadata_template, enable_intelligent_crop: bool, keepers, callback):
+                 cfg, lm_settings, metadata_template, enable_intelligent_crop: bool, keepers, callback,
+                 captions: CaptionStage|None=None, journal: ExportJournal|None=None,
+                 reports: ReportWriter|None=None, text_reports: bool=False, placement: str="hardlink",
+                 output_profile: str="png", token: CancelToken|None=None):
         super().__init__()
         self.item = item
         self.index = index
@@ -208,11 +697,49 @@ class ExportImageRunnable(QRunnable):
         self.enable_intelligent_crop = enable_intelligent_crop
         self.keepers = keepers
         self.callback = callback
+        self.captions = captions
+        self.journal = journal
+        self.reports = reports
+        self.text_reports = text_reports
+        self.placement = placement
+        self.output_profile = output_profile
+        self.token = token or CancelToken()
+        self.skipped = False
+        self.cancelled = False
+        self.deferred = False
+
+    def skip(self):
+        """Reports the item as cancelled without exporting it (dropped from the queue)."""
+        self.callback(None, cancelled=True)
+
+    def _resume(self, entry: dict) -> dict:
+        """Re-queues captions that are still missing for an already exported item."""
+        caption = entry.get("caption")
+        if self.captions is not None and caption:
+            saved_path = self.out_dir / caption["output"]
+            cap_prompt, tag_prompt = caption_prompts(caption["category"], self.lm_settings)
+            if (cap_prompt and not (saved_path.parent / f"{caption['stem']}.txt").exists()) or \
+                    (tag_prompt and not (saved_path.parent / f"{caption['stem']}.tags.txt").exists()):
+                self.captions.submit(CaptionJob(saved_path, caption["stem"], caption["category"], Path(entry["src"]).name))
+        if self.reports is not None and entry.get("report"):
+            self.reports.add_report(entry["report"])
+        self.skipped = True
+        return entry["row"]
 
     def run(self):
         manifest_row = None
         try:
+            self.token.check()
             src = Path(self.item["path"])
+            if self.journal is not None:
+                entry = self.journal.completed(src)
+                # a rescan may have re-labelled it (e.g. now a duplicate)
+                if entry is not None and (entry["row"].get("status"), entry["row"].get("dup_of")) == \
+                        (self.item.get("status"), self.item.get("duplicate_of")):
+                    manifest_row = self._resume(entry)
+                    return
+            caption_info = None
+            caption_job = None
             label = self.item.get("status", "")
             pre = self.item.get("scores", {})
             post = pre
@@ -220,22 +747,23 @@ class ExportImageRunnable(QRunnable):
 
             # Selection gate: include/exclude patterns and min score
             path_for_match = str(src)
-            if self.cfg.include_globs and not any(fnmatch.fnmatch(path_for_match.lower().replace("\\","/"), pat.strip().lower()) for pat in self.cfg.include_globs.split(",")):
+            if self.cfg.include_globs and not _glob_match(path_for_match, self.cfg.include_globs):
                 selected_for_training = False
             else:
-                if any(fnmatch.fnmatch(path_for_match.lower().replace("\\","/"), pat.strip().lower()) for pat in self.cfg.exclude_globs.split(",")):
+                if _glob_match(path_for_match, self.cfg.exclude_globs):
                     selected_for_training = False
                 else:
-                    selected_for_training = (pre.get("final",0) >= self.cfg.sel_min_score)
+                    # bool(): fresh-scan scores are numpy floats, and the journal/report are JSON
+                    selected_for_training = bool(pre.get("final",0) >= self.cfg.sel_min_score)
 
             # Duplicate placement
             if self.item["name"] not in self.keepers and label == "DUPLICATE":
-                (self.out_dir / "duplicates" / src.name).write_bytes(Path(src).read_bytes())
+                output, _ = place_file(src, self.out_dir / "duplicates" / src.name, self.placement)
                 category_out = "duplicates"
             else:
                 fixed_img = None
                 accepted = (label == "PASS")
-                im = load_image_fix(src)
+                im = load_image_cached(src)
                 cv_orig = pil_to_cv(im)
 
                 if label == "FAIL" and self.apply_autofix:
@@ -248,6 +776,8 @@ class ExportImageRunnable(QRunnable):
                     )
                     accepted = (post.get("final",0) >= self.cfg.pass_threshold)
 
+                # last stop before the LLM rename and the encode
+                self.token.check()
                 if accepted:
                     target_dir = "rescued" if (label == "FAIL") else "pass"
                     cv = fixed_img if fixed_img is not None else cv_orig
@@ -258,9 +788,15 @@ class ExportImageRunnable(QRunnable):
                         out = bucket_square(cv, target)
 
                     final_stem = src.stem
-                    if self.lm_settings.get("enabled") and self.lm_settings.get("rename_pattern"):
+                    combined = {}
+                    rename = bool(self.lm_settings.get("enabled") and self.lm_settings.get("rename_pattern"))
+                    # With a caption stage the file is encoded under the source stem
+                    # and renamed there; only without one is the slug fetched here
+                    if rename and self.captions is None:
+                        if self.lm_settings.get("combined_request"):
+                            combined = combined_fields(src, target_dir, self.lm_settings, out)
                         try:
-                            desc = lmstudio_describe(
+                            desc = combined.get("slug") or lmstudio_describe(
                                 self.lm_settings.get("endpoint"),
                                 self.lm_settings.get("model"),
                                 str(src)
@@ -275,55 +811,20 @@ class ExportImageRunnable(QRunnable):
                             print(f"LM Studio rename failed for {src.name}: {e}")
                             final_stem = f"rename-failed-{self.index:05d}"
 
-                    saved_path = self.out_dir / target_dir / f"{final_stem}.{target}.png"
-                    pil_out = cv_to_pil(out)
-
-                    info = PngImagePlugin.PngInfo()
-                    if self.metadata_template.get("Artist"):
-                        info.add_text("Artist", self.metadata_template["Artist"])
-                    if self.metadata_template.get("Copyright"):
-                        info.add_text("Copyright", self.metadata_template["Copyright"])
-                    if self.metadata_template.get("ImageDescription"):
-                        info.add_text("Description", self.metadata_template["ImageDescription"])
-                    if self.metadata_template.get("UserComment"):
-                        info.add_text("Comment", self.metadata_template["UserComment"])
+                    profile = get_profile(self.output_profile)
+                    saved_path = self.out_dir / target_dir / f"{final_stem}.{target}.{profile.ext}"
 
-                    pil_out.save(saved_path, optimize=True, pnginfo=info)
+                    data = encode_image(out, profile, self.metadata_template)
+                    saved_path.write_bytes(data)
+                    output = saved_path
                     category_out = target_dir
 
-                    if self.lm_settings.get("enabled"):
-                        prompt_key = "caption_prompt_pass"
-                        if category_out == "rescued":
-                            prompt_key = "caption_prompt_rescued"
-
-                        cap_prompt = self.lm_settings.get(prompt_key, "")
-                        tag_prompt = self.lm_settings.get("tags_prompt", "")
-
-                        if cap_prompt and self.lm_settings.get("save_captions", True):
-                            try:
-                                caption = lmstudio_caption(
-                                    self.lm_settings.get("endpoint"),
-                                    self.lm_settings.get("model"),
-                                    str(saved_path),
-                                    cap_prompt,
-                                    self.lm_settings.get("vision_mode", False)
-                                )
-                                (saved_path.parent / f"{final_stem}.txt").write_text(caption, encoding="utf-8")
-                            except Exception as e:
-                                print(f"LM Studio caption failed for {src.name}: {e}")
-
-                        if tag_prompt and self.lm_settings.get("save_captions", True):
-                            try:
-                                tags = lmstudio_tags(
-                                    self.lm_settings.get("endpoint"),
-                                    self.lm_settings.get("model"),
-                                    str(saved_path),
-                                    tag_prompt,
-                                    self.lm_settings.get("vision_mode", False)
-                                )
-                                (saved_path.parent / f"{final_stem}.tags.txt").write_text(tags, encoding="utf-8")
-                            except Exception as e:
-                                print(f"LM Studio tagging failed for {src.name}: {e}")
+                    caption_info = {"output": saved_path.relative_to(self.out_dir).as_posix(),
+                                    "stem": final_stem, "category": category_out}
+                    if self.captions is not None:
+                        caption_job = CaptionJob(saved_path, final_stem, category_out, src.name, combined)
+                        if rename:
+                            caption_job.rename_index, caption_job.source = self.index, str(src)
                 else:
                     final_score = post.get("final", pre.get("final",0))
                     near = (self.cfg.pass_threshold - final_score) <= 5.0
@@ -333,16 +834,30 @@ class ExportImageRunnable(QRunnable):
                         post.get("noise", pre.get("noise",0)) < 90.0
                     ])
                     category_out = "maybe" if (near or metrics_below == 1) else "fail"
-                    (self.out_dir / category_out / src.name).write_bytes(Path(src).read_bytes())
+                    output, _ = place_file(src, self.out_dir / category_out / src.name, self.placement)
 
-            rep = self.out_dir / "reports" / f"{src.stem}.txt"
-            with open(rep, "w", encoding="utf-8") as f:
-                f.write(f"Image: {src.name}\n")
-                f.write(f"Initial status: {label}\n")
-                f.write(f"Selected for training (rule gate): {selected_for_training} (min={self.cfg.sel_min_score}, include='{self.cfg.include_globs}', exclude='{self.cfg.exclude_globs}')\n")
-                f.write(f"PRE — sharp:{pre.get('sharpness',0):.1f} contrast:{pre.get('contrast',0):.1f} noise:{pre.get('noise',0):.1f} final:{pre.get('final',0):.1f}\n")
-                f.write(f"POST — sharp:{post.get('sharpness',0):.1f} contrast:{post.get('contrast',0):.1f} noise:{post.get('noise',0):.1f} final:{post.get('final',0):.1f}\n")
-                f.write(f"Bucket: {category_out}\n")
+            report = {
+                "name": src.name, "path": str(src), "status": label, "bucket": category_out,
+                "selected_for_training": selected_for_training,
+                "scan_mode": self.item.get("scan_mode", "full"),
+                "gate": {"min_score": self.cfg.sel_min_score, "include": self.cfg.include_globs, "exclude": self.cfg.exclude_globs},
+                "pre": {k: round(pre.get(k, 0), 2) for k in ("sharpness", "contrast", "noise", "final")},
+                "post": {k: round(post.get(k, 0), 2) for k in ("sharpness", "contrast", "noise", "final")}
+            }
+            if self.reports is not None:
+                self.reports.add_report(report)
+            produced = [output]
+            if self.text_reports:
+                rep = self.out_dir / "reports" / f"{src.stem}.txt"
+                with open(rep, "w", encoding="utf-8") as f:
+                    f.write(f"Image: {src.name}\n")
+                    f.write(f"Initial status: {label}\n")
+                    f.write(f"Scan mode: {self.item.get('scan_mode', 'full')}\n")
+                    f.write(f"Selected for training (rule gate): {selected_for_training} (min={self.cfg.sel_min_score}, include='{self.cfg.include_globs}', exclude='{self.cfg.exclude_globs}')\n")
+                    f.write(f"PRE — sharp:{pre.get('sharpness',0):.1f} contrast:{pre.get('contrast',0):.1f} noise:{pre.get('noise',0):.1f} final:{pre.get('final',0):.1f}\n")
+                    f.write(f"POST — sharp:{post.get('sharpness',0):.1f} contrast:{post.get('contrast',0):.1f} noise:{post.get('noise',0):.1f} final:{post.get('final',0):.1f}\n")
+                    f.write(f"Bucket: {category_out}\n")
+                produced.append(rep)
 
             manifest_row = {
                 "name": src.name,
@@ -351,30 +866,47 @@ class ExportImageRunnable(QRunnable):
                 "bucket": category_out,
                 "selected_for_training": selected_for_training,
                 "final_score": f"{post.get('final', pre.get('final',0)):.1f}",
-                "dup_of": self.item.get("duplicate_of","")
+                "dup_of": self.item.get("duplicate_of",""),
+                "output": output.relative_to(self.out_dir).as_posix()
             }
+            if caption_job is not None and caption_job.rename_index is not None:
+                # the output is not final yet; the caption stage records it once renamed
+                caption_job.record = {"src": src, "row": manifest_row, "files": produced,
+                                     "caption": caption_info, "report": report}
+                self.deferred = True
+            elif self.journal is not None:
+                self.journal.record(src, manifest_row, produced, caption_info, report)
+            if caption_job is not None:
+                self.captions.submit(caption_job)
+        except Cancelled:
+            self.cancelled = True
         except Exception:
             # Log error
             pass
         finally:
-            self.callback(manifest_row)
+            self.callback(manifest_row, self.skipped, self.cancelled, self.deferred)
 
 class VLMCropSignals(QObject):
     job_done = Signal(str)
 
 class VLMCropRunnable(QRunnable):
     def __init__(self, path: str, output_dir: Path, prompt: str,
-                 lm_settings: dict, signals: VLMCropSignals):
+                 lm_settings: dict, signals: VLMCropSignals, token: CancelToken|None=None):
         super().__init__()
         self.path = path
         self.output_dir = output_dir
         self.prompt = prompt
         self.lm_settings = lm_settings
         self.signals = signals
+        self.token = token or CancelToken()
+
+    def skip(self):
+        self.signals.job_done.emit(self.path)
 
     @Slot()
     def run(self):
         try:
+            self.token.check()
             bbox = lmstudio_get_bbox(
                 self.lm_settings.get("endpoint"),
                 self.lm_settings.get("model"),
@@ -384,8 +916,9 @@ class VLMCropRunnable(QRunnable):
 
             if not bbox:
                 raise Exception("VLM did not return a valid bounding box.")
+            self.token.check()
 
-            cv_img = pil_to_cv(load_image_fix(Path(self.path)))
+            cv_img = pil_to_cv(load_image_cached(Path(self.path)))
             h, w = cv_img.shape[:2]
 
             x1, y1, x2, y2 = bbox
@@ -408,6 +941,8 @@ class VLMCropRunnable(QRunnable):
             out_path = self.output_dir / Path(self.path).name
             cv_to_pil(crop_img).save(out_path, optimize=True)
 
+        except Cancelled:
+            pass
         except Exception as e:
             print(f"VLM Crop failed for {self.path}: {e}")
         finally:
@@ -424,13 +959,22 @@ class VLMCropManager(QObject):
         self.output_dir = output_dir
         self.prompt = prompt
         self.lm_settings = lm_settings
+        configure_lmstudio(self.lm_settings)
 
         self.signals = VLMCropSignals()
         self.signals.job_done.connect(self.on_job_done)
+        self.scheduler = WorkScheduler(QThreadPool.globalInstance())
+        self.token = CancelToken()
 
         self.total = len(self.image_paths)
         self.done = 0
 
+    def cancel(self):
+        """Drops queued crops; a crop already waiting on the VLM is not saved. Safe from any thread."""
+        self.token.cancel()
+        for r in self.scheduler.clear():
+            r.skip()
+
     @Slot(str)
     def on_job_done(self, path):
         self.done += 1
@@ -448,9 +992,10 @@ class VLMCropManager(QObject):
                     self.output_dir,
                     self.prompt,
                     self.lm_settings,
-                    self.signals
+                    self.signals,
+                    self.token
                 )
-                QThreadPool.globalInstance().start(runnable)
+                self.scheduler.submit(runnable)
         except Exception as e:
             print(f"VLMCropManager failed to start: {e}")
             self.finished.emit()